@@ -0,0 +1,171 @@
+"""
+Learned value baselines for outcome-sampling MCCFR (VR-MCCFR, Schmid et
+al. 2019). Along a sampled card order the values are rebuilt bottom-up:
+after player i plays a and the opponent plays b in round k, the sampled
+value of (h, a) is
+
+	u(h, a) = sum_b' sigma_opp(b') c(I, a, b') + sigma_opp(b)/xi*(g(k, a, b) + u(next history) - c(I, a, b))
+
+and at player i's information set I every card gets the corrected value
+
+	u(h, a') = b(I, a') + 1[a' = a]*(u(h, a) - b(I, a'))/xi
+
+with xi = 1/(n - k) the probability of sampling either card, so
+u(h) = sum_a' sigma(a') u(h, a'). Cards that were not sampled are valued at
+their baseline instead of 0, and a sampled card only contributes its
+deviation from the baseline, so the closer b(I, a) is to the expected
+value the smaller the variance, while any baseline fixed before the
+sample keeps the estimate unbiased. The regrets of I are
+pi_opp(h)/q(h)*(u(h, a') - u(h)), the standard outcome-sampling estimator
+(which weights the opponent's whole sampled reach, unlike the thesis's);
+with zero baselines this is plain outcome sampling. So --baselines changes
+the estimator as well as adding baselines: the variance monitor computes,
+on the same samples, the thesis's regrets that runMCCFR uses by default
+and plain outcome sampling's, and reports the reduction against both.
+AOS does not use baselines.
+
+Baselines b(I, a) and c(I, a, b), the latter correcting the opponent's
+card the same way, are kept per player and move towards every sampled
+u(h, a) (and g(k, a, b) + u(next history)) after they have been used.
+"""
+
+from math import factorial
+import numpy as np
+from Goofspiel import roundPayoffs
+from Telemetry import WindowStats
+
+class ValueBaselines:
+	# Baselines of both players for Goofspiel(maxcard), moving at least `decay` towards each sample
+	def __init__(self, maxcard, decay = 0.05, monitor = True):
+		# Corner Case: Invalid Input
+		if not 0 < decay <= 1:
+			raise ValueError("decay must be in (0, 1].")
+
+		self.maxcard = maxcard
+		self.decay = decay
+		self.monitor = monitor
+		shape = (2, 1 << maxcard, maxcard)
+		self.values = np.zeros(shape) # b(I, a) of each player
+		self.counts = np.zeros(shape, dtype = np.int64) # samples behind every baseline
+		self.joint = np.zeros(shape + (maxcard,)) # c(I, a, b) of each player
+		self.jointCounts = np.zeros(shape + (maxcard,), dtype = np.int64)
+		self.payoffs = roundPayoffs(maxcard) # payoffs[k, a - 1, b - 1]
+		self.thesis = [WindowStats() for j in range(maxcard)] # the thesis's (default) regrets per depth
+		self.raw = [WindowStats() for j in range(maxcard)] # plain outcome-sampling regrets per depth
+		self.corrected = [WindowStats() for j in range(maxcard)] # baseline-corrected regrets per depth
+
+	# Corrected regrets (K, maxcard, maxcard) of player i at every depth of K sampled card orders
+	# (card columns, shape (K, maxcard)) of player i and the opponent
+	def regrets(self, i, tables, own, opp, sigma_player, sigma_opponent):
+		K, n = own.shape
+		rows = np.arange(K)
+		masks = np.empty((K, n), dtype = np.int64)
+		opps = np.empty((K, n), dtype = np.int64)
+		masks[:, 0] = opps[:, 0] = tables.full
+		for k in range(n - 1):
+			masks[:, k + 1] = tables.successor[masks[:, k], own[:, k]]
+			opps[:, k + 1] = tables.successor[opps[:, k], opp[:, k]]
+		# Opponent's reach over the sampling probability of each prefix
+		chance = sigma_opponent[opps, opp]
+		weight = np.hstack([np.ones((K, 1)), np.cumprod(chance*(n - np.arange(n))**2, axis = 1)[:, :-1]])
+		if self.monitor:
+			thesis = self.thesisRegrets(tables, own, opp, masks, chance, sigma_player)
+
+		regret = np.zeros((K, n, n))
+		after = np.zeros((K, n)) # sampled u(h, a) of every round, for the baseline update
+		outcome = np.zeros((K, n)) # sampled value once both cards of the round are known
+		future = np.zeros(K) # u of the history after round k
+		plain = np.zeros(K) # the same with zero baselines
+		for k in reversed(range(n)):
+			a = own[:, k]
+			member = tables.member[masks[:, k]]
+			sigma = sigma_player[masks[:, k]]
+			payoff = self.payoffs[k, a, opp[:, k]]
+			# Opponent's cards valued at their baselines, the sampled one corrected
+			c = self.joint[i, masks[:, k], a]*tables.member[opps[:, k]]
+			outcome[:, k] = payoff + future
+			after[:, k] = (sigma_opponent[opps[:, k]]*c).sum(axis = 1) + chance[:, k]*(n - k)*(outcome[:, k] - c[rows, opp[:, k]])
+
+			b = self.values[i, masks[:, k]]*member
+			v = b.copy()
+			v[rows, a] += (after[:, k] - b[rows, a])*(n - k)
+			future = (sigma*v).sum(axis = 1)
+			regret[:, k] = weight[:, k, None]*(v - future[:, None])*member
+
+			if self.monitor:
+				value = chance[:, k]*(n - k)**2*(payoff + plain)
+				plain = sigma[rows, a]*value
+				raw = -(weight[:, k]*plain)[:, None]*member
+				raw[rows, a] += weight[:, k]*value
+				self.record(k, thesis[:, k][member], raw[member], regret[:, k][member])
+
+		self.observe(self.values[i], self.counts[i], masks*self.maxcard + own, after)
+		self.observe(self.joint[i], self.jointCounts[i], (masks*self.maxcard + own)*self.maxcard + opp, outcome)
+		return regret
+
+	# Regrets (K, maxcard, maxcard) of the same samples under the thesis's estimator
+	# (MCCFR's default), at the strategies the samples were drawn with
+	def thesisRegrets(self, tables, own, opp, masks, chance, sigma_player):
+		K, n = own.shape
+		ones = np.ones((K, 1))
+		reach = np.hstack([ones, np.cumprod(sigma_player[masks, own], axis = 1)])
+		reach_opp = np.hstack([ones, np.cumprod(chance, axis = 1)])
+		utility = self.payoffs[np.arange(n), own, opp].sum(axis = 1)
+		W = utility[:, None]*reach_opp[:, :-1]*float(factorial(n))**2
+		pi_full = reach[:, -1:]
+		live = pi_full > 0
+		notplayed = -W*np.divide(pi_full, reach[:, :-1], out = np.zeros((K, n)), where = live)
+		played = W*np.divide(pi_full, reach[:, 1:], out = np.zeros((K, n)), where = live)
+		regret = notplayed[:, :, None]*tables.member[masks]
+		regret[np.arange(K)[:, None], np.arange(n), own] += played
+		return regret
+
+	# Move the baselines at flat indices keys towards the mean of their samples x:
+	# a plain mean at first, then at least `decay`
+	def observe(self, values, counts, keys, x):
+		keys, inverse, seen = np.unique(keys.ravel(), return_inverse = True, return_counts = True)
+		mean = np.bincount(inverse.ravel(), weights = x.ravel())/seen
+		values, counts = values.reshape(-1), counts.reshape(-1)
+		counts[keys] += seen
+		step = np.maximum(seen/counts[keys], self.decay)
+		values[keys] += step*(mean - values[keys])
+
+	# Add the thesis's, plain and corrected regrets of depth j to the variance monitor
+	def record(self, j, thesis, raw, corrected):
+		for stats, values in [(self.thesis[j], thesis), (self.raw[j], raw), (self.corrected[j], corrected)]:
+			if len(values) > 0:
+				mean = values.mean()
+				stats.combine(len(values), mean, ((values - mean)**2).sum())
+
+	# Per depth: regrets seen and their variance under the thesis's, plain and corrected estimators
+	def report(self):
+		return [{"depth": j, "count": self.raw[j].count, "thesis": self.thesis[j].variance(),
+			"raw": self.raw[j].variance(), "corrected": self.corrected[j].variance()} for j in range(self.maxcard)]
+
+	# Printable summary of report(), with the reduction against the default (thesis) and plain estimators
+	def format(self):
+		lines = ["depth      count     thesis var        raw var  corrected var  vs thesis   vs raw"]
+		for r in self.report():
+			thesis = r["thesis"]/r["corrected"] if r["corrected"] > 0 else float("nan")
+			raw = r["raw"]/r["corrected"] if r["corrected"] > 0 else float("nan")
+			lines.append("%5d %10d %14.6g %14.6g %14.6g %9.2fx %7.2fx" % (r["depth"], r["count"], r["thesis"], r["raw"], r["corrected"], thesis, raw))
+		return "\n".join(lines)
+
+	# Arrays to store in a checkpoint
+	def state(self):
+		moments = np.array([[s.count, s.mean, s.m2] for s in self.thesis + self.raw + self.corrected])
+		return {"values": self.values, "counts": self.counts, "joint": self.joint,
+			"joint_counts": self.jointCounts, "moments": moments,
+			"settings": np.array([self.decay, float(self.monitor)])}
+
+	@classmethod
+	def from_state(cls, maxcard, state):
+		decay, monitor = state["settings"]
+		baselines = cls(maxcard, float(decay), bool(monitor))
+		baselines.values[:] = state["values"]
+		baselines.counts[:] = state["counts"]
+		baselines.joint[:] = state["joint"]
+		baselines.jointCounts[:] = state["joint_counts"]
+		for stats, (count, mean, m2) in zip(baselines.thesis + baselines.raw + baselines.corrected, state["moments"]):
+			stats.count, stats.mean, stats.m2 = int(count), mean, m2
+		return baselines
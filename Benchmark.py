@@ -0,0 +1,365 @@
+"""
+Benchmark suite for MCCFR/AOS training throughput and the hot helpers.
+Training is measured as iterations/sec and sampled terminal histories/sec
+(all of them for full-width CFR) on fresh tables; helpers are measured as
+seconds per call on a fixed set of random inputs. Results are written as
+JSON and can be compared against a stored baseline run, e.g.
+
+	python Benchmark.py --maxcard 3 4 5 --output bench.json --baseline baseline.json
+
+exits with status 1 when a measurement is slower than the baseline by
+more than the tolerance.
+"""
+
+from itertools import combinations
+from math import factorial
+import numpy as np
+import argparse
+import itertools
+import platform
+import json
+import time
+import timeit
+import copy
+import sys
+import os
+import tempfile
+import MCCFR
+import FinalAlgorithm
+import VanillaCFR
+from Goofspiel import Goofspiel, scoreGame
+from HistoryIndex import getIndex
+from Sampling import SamplingStream, getStream
+from Policy import exportPolicy, Policy
+from Evaluate import uniformStrategy
+from InfoSetTables import InfoSetTables, computeMaskPath, regretMatchVector, maskCards, cardMask
+
+TOLERANCE = 0.10 # relative change reported as faster/slower
+
+# Reference implementations: the dictionary-based helpers the engines used
+# before the InfoSetTables arrays. Training no longer calls them; they are
+# kept here only as the baseline the replacements are measured against.
+
+"""
+genInitTables initializes initial info-set markers, regret tables,
+cumulative strategy tables for all Information Sets of Goofspiel(maxcard).
+"""
+def genInitTables(maxcard):
+	myList = list(range(1, maxcard + 1))
+
+	# Generate all subsets of a given list
+	subsetList = []
+	for i in range(len(myList) + 1):
+		subsetList += list(combinations(myList, i))
+
+	mykey = {} # (hash, info-set) pairs
+	c_I = {} # information set markers
+	regret = {} # regret tables
+	cumstrat = {} # cumulative strategy tables
+	sigma1 = {} # strategy profile of player 1
+	sigma2 = {} # strategy profile of player 2
+	visits = {} # number of visits of information set
+
+	for s in subsetList:
+		hashval = hash(tuple(s)) # hash value for subset s
+		c_I[hashval] = 0
+		mykey[hashval] = str(s)
+		regret[hashval] = {}
+		cumstrat[hashval] = {}
+		sigma1[hashval] = {}
+		sigma2[hashval] = {}
+		visits[hashval] = 0
+		# nested dictionary for each action in subset s
+		for a in s:
+			regret[hashval][a] = 0
+			cumstrat[hashval][a] = 0
+			sigma1[hashval][a] = 1/len(s)
+			sigma2[hashval][a] = 1/len(s)
+
+	return mykey, c_I, regret, cumstrat, sigma1, sigma2, visits
+
+"""
+computePath computes the probabilibty of ending up at prefix z[I] given
+strategy sigma (replaced by computeMaskPath).
+"""
+def computePath(maxcard, sigma, z):
+	actions = list(range(1, maxcard + 1))
+	prob = 1
+	for i in range(len(z)):
+		hashval = hash(tuple(actions))
+		prob *= sigma[hashval][z[i]]
+		actions.remove(z[i])
+
+	return prob
+
+"""
+regretMatch returns the updated strategy profile after seeing
+regret on a specific information set (replaced by regretMatchVector).
+"""
+def regretMatch(regret, action):
+	# Corner Case: Null Inputs
+	if (regret == None or action == None):
+		raise ValueError("Null inputs.")
+	# Corner Case: Invalid action
+	if action not in regret:
+		raise ValueError("Action not in Information Set.")
+
+	# Sum only positive regrets in regret
+	totalregret = sum(regret[i] for i in regret if regret[i] > 0)
+
+	if totalregret > 0:
+		if regret[action] > 0:
+			return regret[action]/totalregret
+		else:
+			return 0
+	else:
+		return 1/len(regret)
+
+"""
+regretMatchRow returns the regret-matched probability of card a given the
+regret row of an information set and the cards still in it (replaced by
+regretMatchVector).
+"""
+def regretMatchRow(row, cards, a):
+	# Sum only positive regrets in the information set
+	totalregret = sum(row[b - 1] for b in cards if row[b - 1] > 0)
+
+	if totalregret > 0:
+		if row[a - 1] > 0:
+			return row[a - 1]/totalregret
+		else:
+			return 0
+	else:
+		return 1/len(cards)
+
+"""
+sampleCase returns an alternate history based on which information loss
+the player undergoes, drawn from stream (the default stream if None),
+by rejection sampling (replaced by HistoryIndex.sample).
+"""
+def sampleCase(maxcard, subscheme, i, stream = None):
+	# Corner Case: Invalid Input
+	if (subscheme == None):
+		raise ValueError("Null Input.")
+
+	history = copy.deepcopy(list(subscheme))
+	# Unzip history of players[]
+	Q = list(zip(*history))
+	Q1 = list(Q[0])
+	Q2 = list(Q[1])
+
+	# Utility of players at given prefix z[I]
+	util1, util2 = FinalAlgorithm.genRewards(Q1, Q2)
+
+	allactions = list(range(1, maxcard + 1))
+	size = len(Q2)
+	stream = getStream(stream)
+
+	# Maximum possible histories to search
+	MAXITER = FinalAlgorithm.nCr(maxcard, size)*factorial(size)**2
+	iteration = 0
+	while iteration <= MAXITER:
+		if i == 0: # player is player 1
+			Q1 = stream.shuffled(Q1)
+			Q2 = stream.shuffled(allactions)[:size]
+		else: # player is player 2
+			Q1 = stream.shuffled(allactions)[:size]
+			Q2 = stream.shuffled(Q2)
+
+		# Check that utility is preserved
+		reward1, reward2 = FinalAlgorithm.genRewards(Q1, Q2)
+		if util1 == reward1 and util2 == reward2:
+			return Q1, Q2
+		iteration += 1
+
+	# Could not find alternate history
+	return list(Q[0]), list(Q[1])
+
+"""
+measureTraining runs train(tables, N, start, stop, rng) on fresh tables in
+growing blocks until `seconds` have passed, sampling from a stream seeded
+with 0, and returns the iterations run and the time they took.
+"""
+def measureTraining(train, maxcard, seconds):
+	train(InfoSetTables(maxcard), 2, 0, 1, SamplingStream(0)) # build lazy caches (e.g. the history index) first
+	tables = InfoSetTables(maxcard)
+	rng = SamplingStream(0)
+	iterations = 0
+	block = 1
+	elapsed = 0.0
+	while elapsed < seconds:
+		start = time.perf_counter()
+		train(tables, 2, iterations, iterations + block, rng)
+		elapsed += time.perf_counter() - start
+		iterations += block
+		block *= 2
+
+	return iterations, elapsed
+
+"""
+aosSamples returns the number of histories AOS evaluates per iteration in
+sample mode: one terminal history per player plus floor(MAXITER/FACTOR) + 1
+alternate histories at every depth j > 0.
+"""
+def aosSamples(maxcard):
+	alternate = sum(FinalAlgorithm.nCr(maxcard, j)*factorial(j)**2//4 + 1 for j in range(1, maxcard))
+	return 2*(1 + alternate)
+
+"""
+benchTraining returns the throughput results of every training
+configuration for Goofspiel(maxcard).
+"""
+def benchTraining(maxcard, seconds, batch = 256):
+	configs = [
+		("runMCCFR", lambda tables, N, start, stop, rng: MCCFR.trainMCCFR(tables, N, start, stop, rng = rng), 2),
+		("runMCCFR.batch", lambda tables, N, start, stop, rng: MCCFR.trainMCCFR(tables, N, start, stop, batch, rng), 2*batch),
+		("runMCCFR.external", lambda tables, N, start, stop, rng: MCCFR.trainMCCFR(tables, N, start, stop, rng = rng, sampling = "external"), 2*factorial(maxcard)),
+		("runAOS", lambda tables, N, start, stop, rng: FinalAlgorithm.trainAOS(tables, N, start, stop, rng = rng), aosSamples(maxcard)),
+		("runCFR", lambda tables, N, start, stop, rng: VanillaCFR.trainCFR(tables, N, start, stop), factorial(maxcard)**2),
+	]
+
+	results = []
+	for name, train, samples in configs:
+		iterations, elapsed = measureTraining(train, maxcard, seconds)
+		results.append(result(name, maxcard, "iterations_per_sec", iterations/elapsed, "higher"))
+		results.append(result(name, maxcard, "samples_per_sec", iterations*samples/elapsed, "higher"))
+
+	return results
+
+"""
+timeCall returns the best seconds per call of fn over `repeat` timings,
+cycling through the argument tuples in inputs.
+"""
+def timeCall(fn, inputs, repeat = 5):
+	args = itertools.cycle(inputs)
+	timer = timeit.Timer(lambda: fn(*next(args)))
+	number, elapsed = timer.autorange()
+	return min([elapsed] + timer.repeat(repeat - 1, number))/number
+
+"""
+benchCalls returns the per-call cost of the reference helpers above and
+their array-backed replacements on random inputs for Goofspiel(maxcard).
+"""
+def benchCalls(maxcard, repeat = 5, cases = 64):
+	stream = SamplingStream(0)
+	orders = []
+	for k in range(cases):
+		Q1 = stream.permutation(maxcard)
+		Q2 = stream.permutation(maxcard)
+		orders.append((Q1, Q2))
+	depth = max(1, maxcard//2) # prefix length of the alternate-history helpers
+
+	mykey, c_I, regret, cumstrat, sigma1, sigma2, visits = genInitTables(maxcard)
+	tables = InfoSetTables(maxcard)
+	rows = [(dict((a, 2*stream.random() - 1) for a in maskCards(m)), a) for m in range(1, tables.size) for a in maskCards(m)][:cases]
+	arrays = [(np.array([row.get(b, 0) for b in range(1, maxcard + 1)]), list(row), a) for row, a in rows]
+	masks = [cardMask(list(row)) for row, a in rows]
+	index = getIndex(maxcard)
+	folder = tempfile.mkdtemp()
+	policy = Policy(exportPolicy(os.path.join(folder, "policy.pol"), uniformStrategy(maxcard), maxcard))
+
+	calls = [
+		("computePath", computePath, [(maxcard, sigma1, Q1) for Q1, Q2 in orders]),
+		("computeMaskPath", computeMaskPath, [(tables, tables.sigma1, Q1) for Q1, Q2 in orders]),
+		("regretMatch", regretMatch, rows),
+		("regretMatchRow", regretMatchRow, arrays),
+		("regretMatchVector", regretMatchVector, [(row, tables.member[m]) for (row, cards, a), m in zip(arrays, masks)]),
+		("sampleCase", sampleCase, [(maxcard, list(zip(Q1[:depth], Q2[:depth])), k % 2, stream) for k, (Q1, Q2) in enumerate(orders)]),
+		("HistoryIndex.sample", index.sample, [(Q1[:depth], Q2[:depth], k % 2, stream) for k, (Q1, Q2) in enumerate(orders)]),
+		("Stream.permutation", stream.permutation, [(maxcard,)]),
+		("Policy.sample", policy.sample, [(m, stream.random()) for m in masks]),
+		("genRewards", FinalAlgorithm.genRewards, orders),
+		("scoreGame", scoreGame, orders),
+		("Goofspiel.play_round", lambda Q1, Q2: Goofspiel(maxcard, list(Q1), list(Q2)).play_round(), orders),
+	]
+
+	results = [result(name, maxcard, "seconds_per_call", timeCall(fn, inputs, repeat), "lower") for name, fn, inputs in calls]
+	policy.close()
+	os.remove(policy.path)
+	os.rmdir(folder)
+	return results
+
+"""
+result returns one benchmark measurement; better is "higher" or "lower".
+"""
+def result(name, maxcard, metric, value, better):
+	return {"name": name, "maxcard": maxcard, "metric": metric, "value": float(value), "better": better}
+
+"""
+runBenchmarks runs the training and per-call benchmarks for every maxcard
+and returns them with a description of the machine.
+"""
+def runBenchmarks(maxcards = (3, 4, 5), seconds = 2.0, repeat = 5, batch = 256):
+	results = []
+	for maxcard in maxcards:
+		results += benchTraining(maxcard, seconds, batch)
+		results += benchCalls(maxcard, repeat)
+
+	return {
+		"created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+		"python": platform.python_version(),
+		"numpy": np.__version__,
+		"machine": platform.platform(),
+		"results": results,
+	}
+
+"""
+compareBenchmarks returns, for every measurement also in baseline, the
+baseline and current values, the speedup (> 1 means faster) and whether
+it is "faster", "slower" or "same" within tolerance.
+"""
+def compareBenchmarks(current, baseline, tolerance = TOLERANCE):
+	key = lambda r: (r["name"], r["maxcard"], r["metric"])
+	base = {key(r): r for r in baseline["results"]}
+	rows = []
+	for r in current["results"]:
+		if key(r) not in base or base[key(r)]["value"] <= 0 or r["value"] <= 0:
+			continue
+		old = base[key(r)]["value"]
+		speedup = r["value"]/old if r["better"] == "higher" else old/r["value"]
+		verdict = "same"
+		if speedup > 1 + tolerance:
+			verdict = "faster"
+		elif speedup < 1/(1 + tolerance):
+			verdict = "slower"
+		rows.append({"name": r["name"], "maxcard": r["maxcard"], "metric": r["metric"],
+			"baseline": old, "current": r["value"], "speedup": speedup, "verdict": verdict})
+
+	return rows
+
+"""
+printResults prints the measurements, with the baseline comparison if
+given.
+"""
+def printResults(current, comparison = None):
+	if comparison is None:
+		for r in current["results"]:
+			print("%-22s n=%-2d %-20s %.6g" % (r["name"], r["maxcard"], r["metric"], r["value"]))
+		return
+	for r in comparison:
+		print("%-22s n=%-2d %-20s %.6g -> %.6g  x%.2f %s" % (r["name"], r["maxcard"], r["metric"],
+			r["baseline"], r["current"], r["speedup"], r["verdict"]))
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("--maxcard", type = int, nargs = "+", default = [3, 4, 5], help = "game sizes to benchmark")
+	parser.add_argument("--seconds", type = float, default = 2.0, help = "time spent on each training benchmark")
+	parser.add_argument("--repeat", type = int, default = 5, help = "timings per helper (best is kept)")
+	parser.add_argument("--batch", type = int, default = 256, help = "histories per batched MCCFR update")
+	parser.add_argument("--output", default = "benchmark.json", help = "where to write the results")
+	parser.add_argument("--baseline", help = "earlier results to compare against")
+	parser.add_argument("--tolerance", type = float, default = TOLERANCE, help = "relative change treated as noise")
+	args = parser.parse_args()
+
+	current = runBenchmarks(args.maxcard, args.seconds, args.repeat, args.batch)
+	with open(args.output, "w") as f:
+		json.dump(current, f, indent = 1)
+
+	comparison = None
+	if args.baseline is not None:
+		with open(args.baseline) as f:
+			comparison = compareBenchmarks(current, json.load(f), args.tolerance)
+	printResults(current, comparison)
+
+	if comparison is not None and any(r["verdict"] == "slower" for r in comparison):
+		sys.exit(1)
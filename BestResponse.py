@@ -0,0 +1,126 @@
+"""
+Exact best response and exploitability for Goofspiel strategies.
+A player's information set is only the set of cards still in hand, so the
+opponent is seen through the probability that it plays card b in round r.
+Given those marginals a round's expected payoff depends only on the card
+played, and the best response is a dynamic program over remaining-card
+subsets: V(mask) = max_a [h(r, a) + V(mask without a)]. GameTree holds
+the flat arrays of these passes, compiled once per game size and shared
+with full-width CFR (VanillaCFR), which runs the expectation instead of
+the max over the same levels.
+"""
+
+from math import factorial
+import numpy as np
+from InfoSetTables import genMaskTables
+from Goofspiel import roundPayoffs
+
+class GameTree:
+	# Flat arrays of Goofspiel(maxcard), shared by every run of that size
+	def __init__(self, maxcard):
+		self.maxcard = maxcard
+		self.successor, self.member, self.count = genMaskTables(maxcard)
+		# levels[r] = information sets reached at the start of round r
+		self.levels = [np.flatnonzero(self.count == maxcard - r) for r in range(maxcard + 1)]
+		self.masks = np.concatenate(self.levels[:-1]) # every decision point, round by round
+		self.payoffs = roundPayoffs(maxcard) # payoffs[r, a - 1, b - 1]
+		# Card orders that reach an information set of round r, i.e. histories it holds
+		self.orders = np.array([factorial(r) for r in range(maxcard)], dtype = np.float64)
+
+	# Probability that strategy reaches every information set
+	def reach(self, strategy):
+		reach = np.zeros(len(self.count))
+		reach[-1] = 1
+		for masks in self.levels[:-1]:
+			flow = reach[masks, None]*strategy[masks]
+			np.add.at(reach, self.successor[masks].ravel(), flow.ravel())
+		return reach
+
+	# P[r, b - 1] = probability that strategy plays card b in round r, given its reach
+	def marginals(self, strategy, reach):
+		return np.array([(reach[masks, None]*strategy[masks]).sum(axis = 0) for masks in self.levels[:-1]])
+
+	# Counterfactual regrets of strategy against an opponent with round marginals P
+	def regrets(self, strategy, P):
+		h = np.einsum("rab,rb->ra", self.payoffs, P)
+		W = np.zeros(len(self.count)) # expected payoff from each mask onwards
+		regret = np.zeros((len(self.count), self.maxcard))
+		for r in reversed(range(self.maxcard)):
+			masks = self.levels[r]
+			q = (h[r][None, :] + W[self.successor[masks]])*self.member[masks]
+			W[masks] = (strategy[masks]*q).sum(axis = 1)
+			regret[masks] = self.orders[r]*(q - W[masks, None])*self.member[masks]
+		return regret
+
+TREES = {} # maxcard -> GameTree already compiled in this process
+
+"""
+compileTree returns the GameTree of Goofspiel(maxcard), building it on
+first use.
+"""
+def compileTree(maxcard):
+	if maxcard not in TREES:
+		TREES[maxcard] = GameTree(maxcard)
+	return TREES[maxcard]
+
+"""
+maskLevels returns, for every round r, the information sets reached at
+the start of round r (those holding maxcard - r cards).
+"""
+def maskLevels(maxcard):
+	return compileTree(maxcard).levels
+
+"""
+reachProbs returns the probability that strategy reaches every
+information set, starting from the full hand.
+"""
+def reachProbs(strategy, maxcard):
+	return compileTree(maxcard).reach(strategy)
+
+"""
+roundMarginals returns P with P[r, b - 1] the probability that strategy
+plays card b in round r.
+"""
+def roundMarginals(strategy, maxcard):
+	tree = compileTree(maxcard)
+	return tree.marginals(strategy, tree.reach(strategy))
+
+"""
+bestResponse returns the best-response value against opponent and a
+deterministic best-response strategy table.
+"""
+def bestResponse(opponent, maxcard):
+	tree = compileTree(maxcard)
+	# Expected payoff of each card in each round against the opponent
+	h = np.einsum("rab,rb->ra", tree.payoffs, roundMarginals(opponent, maxcard))
+
+	V = np.zeros(1 << maxcard) # memoized subgame values
+	policy = np.zeros((1 << maxcard, maxcard))
+	for r in reversed(range(maxcard)):
+		masks = tree.levels[r]
+		q = h[r][None, :] + V[tree.successor[masks]]
+		q[~tree.member[masks]] = -np.inf
+		best = np.argmax(q, axis = 1)
+		V[masks] = q[np.arange(len(masks)), best]
+		policy[masks, best] = 1
+
+	return V[-1], policy
+
+"""
+expectedPayoff returns player 1's exact expected payoff when strategy1
+plays strategy2.
+"""
+def expectedPayoff(strategy1, strategy2, maxcard):
+	P1 = roundMarginals(strategy1, maxcard)
+	P2 = roundMarginals(strategy2, maxcard)
+	return float(np.einsum("ra,rab,rb->", P1, compileTree(maxcard).payoffs, P2))
+
+"""
+exploitability returns the average gain of the two best responses against
+the profile (sigma1, sigma2). Goofspiel is symmetric and zero-sum with
+value 0, so this is 0 exactly at a Nash equilibrium.
+"""
+def exploitability(sigma1, sigma2, maxcard):
+	value1, policy1 = bestResponse(sigma2, maxcard)
+	value2, policy2 = bestResponse(sigma1, maxcard)
+	return float((value1 + value2)/2)
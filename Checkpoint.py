@@ -0,0 +1,92 @@
+"""
+Binary checkpoints of MCCFR/AOS training state.
+A checkpoint is a single .npz file holding every table of an
+InfoSetTables, the next iteration to run, the run settings and the state
+of the run's SamplingStream, so a resumed run continues bit-for-bit.
+"""
+
+import numpy as np
+import json
+import os
+from InfoSetTables import InfoSetTables
+from Telemetry import RegretTelemetry
+from Baselines import ValueBaselines
+from Sampling import SamplingStream
+from Scheduler import AdaptiveBudget
+
+TABLES = ["regret", "cumstrat", "cumtotal", "sigma1", "sigma2", "visits", "c_I"]
+
+"""
+saveCheckpoint writes tables, the next iteration t, the run settings and
+the state of SamplingStream rng to path, replacing any previous
+checkpoint atomically.
+"""
+def saveCheckpoint(path, tables, t, settings, rng = None, telemetry = None, baselines = None, adaptive = None):
+	# Lazily allocated tables are stored (and resumed) densely
+	if hasattr(tables, "dense"):
+		tables = tables.dense()
+	arrays = {name: getattr(tables, name) for name in TABLES}
+	arrays["iteration"] = np.array(t)
+	arrays["settings"] = np.array(json.dumps(settings))
+	if rng is not None:
+		arrays["stream_state"] = np.array(json.dumps(rng.state()))
+
+	# Flush closed telemetry windows so the saved file offsets are final
+	if telemetry is not None:
+		telemetry.flush()
+		arrays["telemetry"] = np.array(telemetry.dumps())
+	if baselines is not None:
+		for name, array in baselines.state().items():
+			arrays["baseline_" + name] = array
+	if adaptive is not None:
+		arrays["adaptive_state"] = np.array(json.dumps(adaptive.state()))
+
+	tmp = path + ".tmp"
+	with open(tmp, "wb") as f:
+		np.savez(f, **arrays)
+	os.replace(tmp, path)
+
+"""
+loadCheckpoint returns the tables, next iteration, run settings,
+SamplingStream (or None), RegretTelemetry (or None), ValueBaselines
+(or None) and AdaptiveBudget (or None) stored at path.
+"""
+def loadCheckpoint(path):
+	with np.load(path, allow_pickle = False) as data:
+		settings = json.loads(str(data["settings"]))
+		tables = InfoSetTables(settings["maxcard"])
+		for name in TABLES:
+			getattr(tables, name)[:] = data[name]
+		t = int(data["iteration"])
+
+		rng = None
+		if "stream_state" in data:
+			rng = SamplingStream.from_state(json.loads(str(data["stream_state"])))
+
+		telemetry = None
+		if "telemetry" in data:
+			telemetry = RegretTelemetry.loads(str(data["telemetry"]))
+
+		baselines = None
+		if "baseline_values" in data:
+			state = {name[len("baseline_"):]: data[name] for name in data.files if name.startswith("baseline_")}
+			baselines = ValueBaselines.from_state(settings["maxcard"], state)
+
+		adaptive = None
+		if "adaptive_state" in data:
+			adaptive = AdaptiveBudget.from_state(json.loads(str(data["adaptive_state"])))
+
+	return tables, t, settings, rng, telemetry, baselines, adaptive
+
+"""
+checkpointHook returns a per-iteration callback that checkpoints every
+`every` iterations, or None when checkpointing is disabled.
+"""
+def checkpointHook(path, every, tables, settings, rng = None, telemetry = None, baselines = None, adaptive = None):
+	if path is None or every <= 0:
+		return None
+
+	def hook(t):
+		if (t + 1) % every == 0:
+			saveCheckpoint(path, tables, t + 1, settings, rng, telemetry, baselines, adaptive)
+	return hook
@@ -0,0 +1,136 @@
+"""
+Vectorized evaluation of Goofspiel strategies.
+A strategy is a (2^n, n) probability table indexed by [mask, a - 1] like
+the InfoSetTables sigmas. evaluateStrategy samples whole trajectories for
+many games at once and scores them against an opponent strategy (uniform
+random by default); exactEvaluate enumerates every pair of card orders.
+"""
+
+import numpy as np
+from InfoSetTables import genMaskTables
+from Goofspiel import scoreBatch, allPermutations, payoffMatrix
+from Sampling import getStream
+from BestResponse import compileTree
+
+MATRIX_LIMIT = 7 # largest n whose payoff matrix exactEvaluate builds
+
+Z95 = 1.959963984540054 # two-sided 95% normal quantile
+
+"""
+uniformStrategy returns the table that plays every card in hand with
+equal probability.
+"""
+def uniformStrategy(maxcard):
+	successor, member, count = genMaskTables(maxcard)
+	return member/np.maximum(count, 1)[:, None]
+
+"""
+sampleTrajectories samples the card orders of `games` games played with
+strategy, returned as a (games, maxcard) array of cards.
+"""
+def sampleTrajectories(strategy, maxcard, games, rng):
+	successor = compileTree(maxcard).successor
+	masks = np.full(games, (1 << maxcard) - 1, dtype = np.int64)
+	plays = np.empty((games, maxcard), dtype = np.int64)
+	for j in range(maxcard):
+		# Inverse-CDF draw over the cards of each game's information set
+		cum = np.cumsum(strategy[masks], axis = 1)
+		u = rng.random(games)*cum[:, -1]
+		col = np.minimum((cum <= u[:, None]).sum(axis = 1), maxcard - 1)
+		# Rounding at the top of the CDF: take the last card with positive probability instead
+		positive = strategy[masks] > 0
+		last = maxcard - 1 - np.argmax(positive[:, ::-1], axis = 1)
+		col = np.where(positive[np.arange(games), col], col, last)
+		plays[:, j] = col + 1
+		masks = successor[masks, col]
+
+	return plays
+
+"""
+evaluateStrategy plays `games` sampled games of strategy (as player 1)
+against opponent (a strategy table, or None for uniform random play) and
+returns win/loss/tie rates and expected payoff with 95% confidence
+half-widths, drawing from the numpy Generator rng (the default stream's
+if None).
+"""
+def evaluateStrategy(strategy, maxcard, games = 1000000, opponent = None, rng = None, chunk = 200000):
+	if rng is None:
+		rng = getStream().rng
+	if opponent is None:
+		opponent = uniformStrategy(maxcard)
+
+	count = np.zeros(3, dtype = np.int64) # wins, losses, ties
+	total = 0.0
+	squares = 0.0
+	for start in range(0, games, chunk):
+		size = min(chunk, games - start)
+		strategy1 = sampleTrajectories(strategy, maxcard, size, rng)
+		strategy2 = sampleTrajectories(opponent, maxcard, size, rng)
+		reward1, reward2 = scoreBatch(strategy1, strategy2)
+		count += [(reward1 > 0).sum(), (reward1 < 0).sum(), (reward1 == 0).sum()]
+		total += reward1.sum()
+		squares += (reward1**2).sum()
+
+	rates = (count/games).tolist()
+	payoff = float(total/games)
+	variance = max(squares/games - payoff**2, 0)*games/max(games - 1, 1)
+	return {
+		"games": games,
+		"win": rates[0], "loss": rates[1], "tie": rates[2],
+		"payoff": payoff,
+		"win_ci": Z95*(rates[0]*(1 - rates[0])/games)**0.5,
+		"loss_ci": Z95*(rates[1]*(1 - rates[1])/games)**0.5,
+		"tie_ci": Z95*(rates[2]*(1 - rates[2])/games)**0.5,
+		"payoff_ci": Z95*(variance/games)**0.5,
+	}
+
+"""
+permutationProbs returns every card order of maxcard cards together with
+the probability that strategy plays it.
+"""
+def permutationProbs(strategy, maxcard):
+	successor, member, count = genMaskTables(maxcard)
+	perms = allPermutations(maxcard)
+	probs = np.ones(len(perms))
+	masks = np.full(len(perms), (1 << maxcard) - 1, dtype = np.int64)
+	for j in range(maxcard):
+		probs *= strategy[masks, perms[:, j] - 1]
+		masks = successor[masks, perms[:, j] - 1]
+
+	return perms, probs
+
+"""
+exactEvaluate returns the exact win/loss/tie probabilities and expected
+payoff of strategy against opponent (uniform random if None) by
+contracting the n! x n! payoff matrix with both players' card-order
+probabilities. Meant for small n; above MATRIX_LIMIT the pairs are scored
+in chunks instead of building the matrix.
+"""
+def exactEvaluate(strategy, maxcard, opponent = None, chunk = 256, path = None):
+	if opponent is None:
+		opponent = uniformStrategy(maxcard)
+	perms, probs1 = permutationProbs(strategy, maxcard)
+	perms, probs2 = permutationProbs(opponent, maxcard)
+
+	outcome = np.zeros(3) # win, loss, tie probabilities
+	payoff = 0.0
+	if maxcard <= MATRIX_LIMIT:
+		U = payoffMatrix(maxcard, path)
+		for start in range(0, len(perms), chunk):
+			rows = slice(start, start + chunk)
+			reward1 = U[rows]
+			weight = probs1[rows, None]*probs2[None, :]
+			outcome += [weight[reward1 > 0].sum(), weight[reward1 < 0].sum(), weight[reward1 == 0].sum()]
+		payoff = probs1 @ (U @ probs2)
+	else:
+		for start in range(0, len(perms), chunk):
+			rows = slice(start, start + chunk)
+			reward1, reward2 = scoreBatch(perms[rows, None, :], perms[None, :, :])
+			weight = probs1[rows, None]*probs2[None, :]
+			outcome += [weight[reward1 > 0].sum(), weight[reward1 < 0].sum(), weight[reward1 == 0].sum()]
+			payoff += (weight*reward1).sum()
+
+	return {
+		"win": float(outcome[0]), "loss": float(outcome[1]), "tie": float(outcome[2]),
+		"payoff": float(payoff),
+	}
@@ -0,0 +1,135 @@
+"""
+Expected counterfactual regret for AOS.
+At depth j > 0 AOS averages the sampled counterfactual regret over
+alternate histories: a prefix drawn uniformly from the utility-preserving
+prefixes of the HistoryIndex, followed by uniformly random suffixes for
+both players. ExpectedRegret computes that expectation exactly by
+enumerating every such history when there are at most `limit` of them,
+and otherwise averages a fixed budget of sampled histories.
+
+The histories of each (player, information set, prefix utility) class do
+not depend on the strategy profile and are kept for the whole run; only
+this enumeration is memoized. The expectation itself is recomputed on
+every call, since it reads both players' strategy rows at the full hand
+(through the opponent's reach and the liveness of the player's prefix),
+which regret matching changes every iteration.
+"""
+
+from itertools import permutations
+from math import factorial
+import numpy as np
+from Goofspiel import scoreBatch, scoreGame
+from Sampling import getStream
+
+class ExpectedRegret:
+	# Initialize for the given tables and alternate-history index, sampling from stream above the limit
+	def __init__(self, tables, index, limit = 20000, budget = 256, stream = None):
+		self.tables = tables
+		self.stream = stream
+		self.index = index
+		self.limit = limit # largest history set enumerated exactly
+		self.budget = budget # histories sampled above the limit
+		self.histories = {} # (i, mask, utility) -> enumerated histories
+		self.orders = {} # k -> every order of k positions
+
+	# Every order of k positions as a (k!, k) array
+	def positions(self, k):
+		if k not in self.orders:
+			orders = list(permutations(range(k)))
+			self.orders[k] = np.array(orders, dtype = np.int64).reshape(len(orders), k)
+		return self.orders[k]
+
+	# Full histories (Q1, Q2) built from prefix rows g and suffix orders
+	def assemble(self, i, mask, prefixes, g, ownorder, opporder):
+		tables = self.tables
+		maxcard = tables.maxcard
+		own, opp = prefixes
+		own = own[g]
+		opp = opp[g]
+		j = own.shape[1]
+
+		# Cards left to each player after the prefix
+		owncards = np.flatnonzero(tables.member[mask]) + 1
+		oppleft = np.ones((len(g), maxcard), dtype = bool)
+		oppleft[np.arange(len(g))[:, None], opp - 1] = False
+		oppcards = np.nonzero(oppleft)[1].reshape(len(g), maxcard - j) + 1
+
+		Qi = np.hstack([own, owncards[ownorder]])
+		Qo = np.hstack([opp, np.take_along_axis(oppcards, opporder, axis = 1)])
+		if i == 0:
+			return Qi, Qo
+		return Qo, Qi
+
+	# Precompute everything about a set of histories that sigma does not change
+	def structure(self, i, Q1, Q2, j):
+		tables = self.tables
+		Q = [Q1, Q2]
+		masks = []
+		for p in range(2):
+			m = np.empty(Q[p].shape, dtype = np.int64)
+			m[:, 0] = tables.full
+			for k in range(1, Q[p].shape[1]):
+				m[:, k] = tables.successor[m[:, k - 1], Q[p][:, k - 1] - 1]
+			masks.append(m)
+		util = scoreBatch(Q1, Q2)[i]
+		return {
+			"cols": Q[i] - 1, "masks": masks[i],
+			"oppcols": Q[1 - i][:, :j] - 1, "oppmasks": masks[1 - i][:, :j],
+			"util": util, "played": Q[i][:, j] - 1, "j": j,
+		}
+
+	# Sampled counterfactual regret of every action, averaged over histories
+	def average(self, i, mask, h):
+		tables = self.tables
+		maxcard = tables.maxcard
+		j = h["j"]
+		sigma_player = tables.sigma1 if i == 0 else tables.sigma2
+		sigma_opponent = tables.sigma2 if i == 0 else tables.sigma1
+		qz = 1/(factorial(maxcard)**2)
+
+		reach = np.cumprod(sigma_player[h["masks"], h["cols"]], axis = 1)
+		pi_player = reach[:, j - 1]
+		pi_choice = reach[:, j]
+		pi_full = reach[:, -1]
+		pi_opp = np.prod(sigma_opponent[h["oppmasks"], h["oppcols"]], axis = 1)
+		W = h["util"]*pi_opp/qz
+
+		live = pi_full > 0
+		notplayed = -W*np.divide(pi_full, pi_player, out = np.zeros_like(pi_full), where = live)
+		played = W*np.divide(pi_full, pi_choice, out = np.zeros_like(pi_full), where = live)
+		M = len(W)
+		return notplayed.mean()*tables.member[mask] + np.bincount(h["played"], played, minlength = maxcard)/M
+
+	# Expected regret vector at information set mask given the prefix (Q1, Q2)
+	def compute(self, i, mask, Q1, Q2):
+		maxcard = self.tables.maxcard
+		j = len(Q1)
+		util1 = scoreGame(Q1, Q2)[0]
+		key = (i, mask, util1)
+		# Prefixes the index cannot enumerate are always sampled
+		enumerable = self.index.indexed(i, self.tables.full ^ mask)
+		if enumerable:
+			rows, cols, orders = self.index.consistent(i, self.tables.full ^ mask)[util1]
+			enumerable = len(rows)*factorial(maxcard - j)**2 <= self.limit
+		if key in self.histories:
+			h = self.histories[key]
+		elif enumerable:
+			# Enumerate every prefix with every pair of suffix orders
+			prefixes = (orders[rows], self.index.opponent_sequences(j)[cols])
+			suffixes = self.positions(maxcard - j)
+			g, s1, s2 = np.meshgrid(np.arange(len(rows)), np.arange(len(suffixes)), np.arange(len(suffixes)), indexing = "ij")
+			g = g.ravel()
+			Q1full, Q2full = self.assemble(i, mask, prefixes, g, suffixes[s1.ravel()], suffixes[s2.ravel()])
+			h = self.structure(i, Q1full, Q2full, j)
+			self.histories[key] = h
+		else:
+			# Too many histories: average a fixed budget of samples instead
+			prefixes = self.index.draw(Q1, Q2, i, self.budget, self.stream)
+			rng = getStream(self.stream).rng
+			g = np.arange(self.budget)
+			ownorder = np.argsort(rng.random((self.budget, maxcard - j)), axis = 1)
+			opporder = np.argsort(rng.random((self.budget, maxcard - j)), axis = 1)
+			Q1full, Q2full = self.assemble(i, mask, prefixes, g, ownorder, opporder)
+			h = self.structure(i, Q1full, Q2full, j)
+
+		return self.average(i, mask, h)
@@ -6,16 +6,18 @@ set is the expected counterfactual regret across all possible hands given
 the history at the moment.
 """
 
-from itertools import combinations
 from math import factorial
-import pandas as pd
-from pandas import ExcelWriter
-from pandas import ExcelFile
 import numpy as np
-import random
 import math
-import copy
-import sys
+from Checkpoint import loadCheckpoint, checkpointHook
+from Goofspiel import scoreGame
+from HistoryIndex import getIndex
+from ExpectedRegret import ExpectedRegret
+from Telemetry import RegretTelemetry
+from Profiling import combineHooks
+from UpdateRules import makeRule
+from Sampling import getStream, makeStream
+from InfoSetTables import makeTables, maskCards, computeMaskPath, computePrefixPath, regretMatchVector, exportTables
 
 """
 genRewards returns the rewards each player would receive given
@@ -24,144 +26,19 @@ the plays of each.
 def genRewards(strategy1, strategy2):
 	# Corner Case: Invalid length of strategy
 	if (len(strategy1) != len(strategy2)):
-		print("Invalid inputs for strategies.")
-		sys.exit()
+		raise ValueError("Invalid inputs for strategies.")
 
-	reward1 = 0
-	reward2 = 0
-	treasure = len(strategy1)
-	# Compute rewards given strategies 1, 2
-	for i in range(len(strategy1)):
-		# player 1 wins
-		if strategy1[i] > strategy2[i]:
-			reward1 += treasure/2
-			reward2 += -treasure/2
-		# player 2 wins
-		elif strategy1[i] < strategy2[i]:
-			reward1 += -treasure/2
-			reward2 += treasure/2
-		# tie
-		else:
-			pass
-		treasure -= 1
-
-	return reward1, reward2
-
-"""
-genInitTables initializes initial info-set markers, regret tables,
-cumulative strategy tables for all Information Sets provided.
-"""
-def genInitTables(maxcard):
-	myList = list(range(1, maxcard + 1))
-
-	# Generate all subsets of a given list
-	subsetList = []
-	for i in range(len(myList) + 1):
-		subsetList += list(combinations(myList, i))
-
-	mykey = {} # (hash, info-set) pairs
-	c_I = {} # information set markers
-	regret = {} # regret tables
-	cumstrat = {} # cumulative strategy tables
-	sigma1 = {} # strategy profile of player 1
-	sigma2 = {} # strategy profile of player 2
-	visits = {} # number of visits of information set
-
-	for s in subsetList:
-		hashval = hash(tuple(s)) # hash value for subset s
-		c_I[hashval] = 0
-		mykey[hashval] = str(s)
-		regret[hashval] = {}
-		cumstrat[hashval] = {}
-		sigma1[hashval] = {}
-		sigma2[hashval] = {}
-		visits[hashval] = 0
-		# nested dictionary for each action in subset s
-		for a in s:
-			regret[hashval][a] = 0
-			cumstrat[hashval][a] = 0
-			sigma1[hashval][a] = 1/len(s)
-			sigma2[hashval][a] = 1/len(s)	
-
-	return mykey, c_I, regret, cumstrat, sigma1, sigma2, visits
-
-
-"""
-regretMatch returns the updated strategy profile after seeing
-regret on a specific information set.
-"""
-def regretMatch(regret, action):
-	# Corner Case: Null Inputs
-	if (regret == None or action == None):
-		print("Null inputs.")
-		sys.exit()
-	# Corner Case: Invalid action
-	if action not in regret:
-		print("Action not in Information Set.")
-		sys.exit()
-
-	# Sum only positive regrets in regret
-	totalregret = sum(regret[i] for i in regret if regret[i] > 0)
-
-	if totalregret > 0:
-		if regret[action] >= 0:
-			return regret[action]/totalregret
-		else:
-			return 0
-	else:
-		return 1/len(regret)
-
-"""
-sampleCase returns an alternate history based on which information loss
-the player undergoes.
-"""
-def sampleCase(maxcard, subscheme, i):
-	# Corner Case: Invalid Input
-	if (subscheme == None):
-		print("Null Input.")
-		sys.exit()
-
-	history = copy.deepcopy(list(subscheme))
-	# Unzip history of players[]
-	Q = list(zip(*history))
-	Q1 = list(Q[0])
-	Q2 = list(Q[1])
-
-	# Utility of players at given prefix z[I]
-	util1, util2 = genRewards(Q1, Q2)
-
-	allactions = list(range(1, maxcard + 1))
-	size = len(Q2)
-
-	# Maximum possible histories to search
-	MAXITER = nCr(maxcard, size)*math.factorial(size)**2
-	iteration = 0
-	while iteration <= MAXITER:
-		if i == 0: # player is player 1
-			random.shuffle(Q1)
-			Q2 = random.sample(allactions, size)
-		else: # player is player 2
-			Q1 = random.sample(allactions, size)
-			random.shuffle(Q2)
-
-		# Check that utility is preserved	
-		reward1, reward2 = genRewards(Q1, Q2)
-		if util1 == reward1 and util2 == reward2:
-			return Q1, Q2
-		iteration += 1
-
-	# Could not find alternate history
-	return list(Q[0]), list(Q[1])
+	return scoreGame(strategy1, strategy2)
 
 """
 predictHistory returns a sample terminal history given a matched
-history upto point of information loss.
+history upto point of information loss, drawn from stream (the default
+stream if None).
 """
-def predictHistory(maxcard, Q1, Q2):
+def predictHistory(maxcard, Q1, Q2, stream = None):
 	# Corner Case: Invalid Input
 	if Q1 == None or Q2 == None:
-		print("Null Input")
-		sys.exit()
+		raise ValueError("Null Input")
 
 	action1 = list(range(1, maxcard + 1))
 	action2 = list(range(1, maxcard + 1))
@@ -171,10 +48,8 @@ def predictHistory(maxcard, Q1, Q2):
 		action2.remove(Q2[i])
 
 	# Sample the suffix history
-	random.shuffle(action1)
-	random.shuffle(action2)
-
-	return list(action1), list(action2)
+	stream = getStream(stream)
+	return stream.shuffled(action1), stream.shuffled(action2)
 
 """
 nCr(a, b) returns a choose b.
@@ -184,166 +59,227 @@ def nCr(a, b):
 	return val
 
 """
-computePath computes the probabilibty of ending up at prefix z[I] given
-strategy sigma.
+ACTUAL GOOFSPIEL SIMULATION W/ AOS ALGORITHM
+"""
+def runAOS(player, maxcardvalue, iterations = 10000, checkpoint = None, every = 0, tables = None, exact = False, limit = 20000, budget = 256, sparse = False, telemetry = None, profiler = None, onIteration = None, rule = None, rng = None, adaptive = None):
+	N = player
+	maxcard = maxcardvalue
+	# Train into the caller's tables if given, so the arrays can be kept
+	if tables is None:
+		tables = makeTables(maxcard, sparse)
+	# Every sample of the run comes from this stream
+	rng = makeStream(rng)
+	# Streaming aggregates of player 1's sampled regrets, their reservoir seeded from a child stream
+	if telemetry is None:
+		telemetry = RegretTelemetry(seed = rng.spawn(1)[0].rng.integers(1 << 63))
+	rule = makeRule(rule)
+	settings = {"algorithm": "aos", "player": N, "maxcard": maxcard,
+		"iterations": iterations, "every": every,
+		"exact": exact, "limit": limit, "budget": budget, "rule": rule.spec()}
+	hook = telemetryHook(telemetry, combineHooks(checkpointHook(checkpoint, every, tables, settings, rng, telemetry, adaptive = adaptive), onIteration))
+	expected = None
+	if exact:
+		expected = ExpectedRegret(tables, getIndex(maxcard), limit, budget, rng)
+	trainAOS(tables, N, 0, iterations, telemetry, hook, expected, profiler, rule, rng, adaptive)
+	telemetry.finish()
+
+	return exportTables(tables, profiler) + (telemetry,)
+
+"""
+resumeAOS continues the run saved in checkpoint file path, keeps
+checkpointing to the same file and returns what runAOS returns.
+state is what loadCheckpoint(path) returned, if the caller has already
+loaded it (e.g. to build its hooks on the resumed tables).
 """
-def computePath(maxcard, sigma, z):
-    actions = list(range(1, maxcard + 1))
-    prob = 1
-    for i in range(len(z)):
-        hashval = hash(tuple(actions))
-        prob *= sigma[hashval][z[i]]
-        actions.remove(z[i])
+def resumeAOS(path, profiler = None, onIteration = None, state = None):
+	tables, t, settings, rng, telemetry, baselines, adaptive = state if state is not None else loadCheckpoint(path)
+	rng = makeStream(rng)
+	if telemetry is None:
+		telemetry = RegretTelemetry(seed = rng.spawn(1)[0].rng.integers(1 << 63))
+	hook = telemetryHook(telemetry, combineHooks(checkpointHook(path, settings["every"], tables, settings, rng, telemetry, adaptive = adaptive), onIteration))
+	expected = None
+	if settings.get("exact"):
+		expected = ExpectedRegret(tables, getIndex(tables.maxcard), settings["limit"], settings["budget"], rng)
+	trainAOS(tables, settings["player"], t, settings["iterations"], telemetry, hook, expected, profiler, settings.get("rule"), rng, adaptive)
+	telemetry.finish()
+
+	return exportTables(tables, profiler) + (telemetry,)
 
-    return prob
+"""
+telemetryHook returns a per-iteration callback that closes finished
+telemetry windows before calling onIteration (if given), passing on its
+request to stop.
+"""
+def telemetryHook(telemetry, onIteration = None):
+	def hook(t):
+		telemetry.advance(t + 1)
+		if onIteration is not None:
+			return onIteration(t)
+		return False
+	return hook
 
 """
-ACTUAL GOOFSPIEL SIMULATION W/ AOS ALGORITHM
+trainAOS runs AOS iterations start, ..., stop - 1 on tables in place,
+records player 1's sampled regrets into telemetry (if given) and calls
+onIteration(t) after every iteration if given, stopping early once it
+returns True. If expected (an ExpectedRegret) is given, the regret at
+depth j > 0 is its expectation over alternate histories instead of a
+Monte Carlo average; otherwise adaptive (an AdaptiveBudget), if given,
+sets how many alternate histories each depth averages, at most the
+thesis's MAXITER/FACTOR + 1. The time of each phase is charged to
+profiler if given, and rule is an UpdateRule or its name (vanilla, i.e.
+the thesis's update, if None). Every sample is drawn from rng, a
+SamplingStream or a seed for one (see makeStream).
 """
-def runAOS(player, maxcardvalue):
-	N = player
-	maxcard = maxcardvalue
-	iterations = 10000
-	mykey, c_I, regret, cumstrat, sigma1, sigma2, visits = genInitTables(maxcard)
-	regretdata = {} # keeps track of all computed regret values
+def trainAOS(tables, N, start, stop, telemetry = None, onIteration = None, expected = None, profiler = None, rule = None, rng = None, adaptive = None):
+	maxcard = tables.maxcard
+	rule = makeRule(rule)
+	rng = makeStream(rng)
+	regret = tables.regret
+	sigma1 = tables.sigma1
+	sigma2 = tables.sigma2
+	visits = tables.visits
+	member = tables.member
+	index = getIndex(maxcard) # utility-preserving alternate histories
+	timed = profiler is not None
 
 	# At each iteration
-	for t in range(iterations):
-		print("Iteration: ", t)
-		regretdata[t] = {}
+	for t in range(start, stop):
 		# For each player
 		for i in range(N):
-			# Actions available to player
-			infoset = list(range(1, maxcard + 1))
-
+			if timed:
+				mark = profiler.start()
 			reward = maxcard
 			# Sample a terminal history
-			Q1 = list(range(1, maxcard + 1))
-			Q2 = list(range(1, maxcard + 1))
-			random.shuffle(Q1)
-			random.shuffle(Q2)
+			Q1 = rng.permutation(maxcard)
+			Q2 = rng.permutation(maxcard)
 			Q = [0]*2
 			Q[0] = Q1
 			Q[1] = Q2
-			lastaction = Q[0][4] # last action taken by player 1
+			lastaction = Q[0][maxcard - 1] # last action taken by player 1
 			utility = genRewards(Q1, Q2)
+			# Information sets player i passes through
+			masks = tables.path_masks(Q[i])
+			qz = 1/(factorial(maxcard)**2) # sampling probability
+			sigma_player = sigma1
+			sigma_opponent = sigma2
+			if i == 1:
+				sigma_player = sigma2
+				sigma_opponent = sigma1
+			if timed:
+				mark = profiler.lap("sampling", mark)
 			# At each prefix history that player i plays
 			for j in range(maxcard):
-				# Hash value for current information set
-				hashval = hash(tuple(infoset))
-				visits[hashval] += 1
+				# Bitmask of current information set and actions available
+				mask = masks[j]
+				infoset = maskCards(mask)
+				visits[mask] += 1
 				# If this isn't the start of the game
 				if j > 0:
-					# Maximum possible histories to search
-					MAXITER = nCr(maxcard, j)*math.factorial(j)**2
-					iteration = 0
-					# Create cumulative regret list for each action from infoset
-					cumRegret = {a: [0] for a in infoset}
-					if i == 0:
-						regretdata[t][j] = [0]
-					FACTOR = 4
-					while iteration <= MAXITER/FACTOR:
-						# Discard piles of both players
-						subscheme = zip(Q1[:j], Q2[:j])
-						# Sample a valid alternate history
-						newQ1, newQ2 = sampleCase(maxcard, subscheme, i)
-						nextQ1, nextQ2 = predictHistory(maxcard, newQ1, newQ2)
-						newQ1 += list(nextQ1)
-						newQ2 += list(nextQ2)
-						newQ = [0]*2
-						newQ[0] = newQ1
-						newQ[1] = newQ2
-						util = genRewards(newQ1, newQ2)
-						
-						# For each action available
-						for a in infoset:
-							qz = 1/(factorial(maxcard)**2)
-							sigma_player = sigma1
-							sigma_opponent = sigma2
-							if i == 1:
-								sigma_player = sigma2
-								sigma_opponent = sigma1
-
-							pi_opp = computePath(maxcard, sigma_opponent, newQ[1 - i][:j])
+					if expected is not None:
+						# Exact (or fixed-budget) expectation over alternate histories
+						vector = expected.compute(i, mask, Q1[:j], Q2[:j])
+						if timed:
+							mark = profiler.lap("regret", mark)
+						aveRegret = {a: vector[a - 1] for a in infoset}
+						if i == 0 and telemetry is not None:
+							telemetry.record(t, j, [aveRegret[a] for a in infoset if a == lastaction])
+					else:
+						# Maximum possible histories to search
+						MAXITER = nCr(maxcard, j)*math.factorial(j)**2
+						iteration = 0
+						# Create cumulative regret list for each action from infoset
+						cumRegret = {a: [0] for a in infoset}
+						samples = [0] # sampled regrets of the last action, seeded like cumRegret
+						FACTOR = 4
+						# Histories averaged at this depth, MAXITER/FACTOR + 1 in the thesis
+						histories = MAXITER//FACTOR + 1
+						if adaptive is not None:
+							histories = adaptive.size(j, histories)
+						while iteration < histories:
+							# Sample a valid alternate history of the discard piles
+							newQ1, newQ2 = index.sample(Q1[:j], Q2[:j], i, rng)
+							nextQ1, nextQ2 = predictHistory(maxcard, newQ1, newQ2, rng)
+							newQ1 += list(nextQ1)
+							newQ2 += list(nextQ2)
+							newQ = [0]*2
+							newQ[0] = newQ1
+							newQ[1] = newQ2
+							util = genRewards(newQ1, newQ2)
+							if timed:
+								mark = profiler.lap("sampling", mark)
+
+							# Reach probabilities of the alternate history, shared by every action
+							pi_opp = computeMaskPath(tables, sigma_opponent, newQ[1 - i][:j])
 							W = util[i]*pi_opp/qz
-
-							# Compute sampled counterfactual regret
-							pi_full = computePath(maxcard, sigma_player, newQ[i])
-							pi_player = computePath(maxcard, sigma_player, newQ[i][:j])
-							if a != newQ[i][j]: # z[I]a not in z
-								if pi_full != 0:
-									rtilda = -W*pi_full/pi_player
+							reach = computePrefixPath(tables, sigma_player, newQ[i])
+							pi_player = reach[j]
+							pi_choice = reach[j + 1]
+							pi_full = reach[maxcard]
+							if timed:
+								mark = profiler.lap("reach", mark)
+
+							# For each action available
+							for a in infoset:
+								# Compute sampled counterfactual regret
+								if a != newQ[i][j]: # z[I]a not in z
+									if pi_full != 0:
+										rtilda = -W*pi_full/pi_player
+									else:
+										rtilda = 0
 								else:
-									rtilda = 0
-							else:
-								pi_choice = computePath(maxcard, sigma_player, newQ[i][:j + 1])
-								if pi_full != 0:
-									rtilda = W*pi_full*((1/pi_choice) - (1/pi_player))
-								else:
-									rtilda = 0
-
-							cumRegret[a] += [rtilda]
-							if i == 0 and a == lastaction:
-								regretdata[t][j] += [rtilda]
-						iteration += 1
-					# Convert cumulative regret into average regret
-					aveRegret = {a: np.mean(cumRegret[a]) for a in cumRegret}
+									if pi_full != 0:
+										rtilda = W*pi_full*((1/pi_choice) - (1/pi_player))
+									else:
+										rtilda = 0
+
+								cumRegret[a] += [rtilda]
+								if i == 0 and a == lastaction:
+									samples += [rtilda]
+							iteration += 1
+							if timed:
+								mark = profiler.lap("regret", mark)
+						if timed:
+							profiler.count("alternate histories", iteration)
+						if adaptive is not None:
+							adaptive.observe(j, [cumRegret[a][1:] for a in infoset])
+						if i == 0 and telemetry is not None:
+							telemetry.record(t, j, samples)
+						# Convert cumulative regret into average regret
+						aveRegret = {a: np.mean(cumRegret[a]) for a in cumRegret}
 
 					# Record average regret I->a into our original terminal history
+					rtilda = np.zeros(maxcard)
 					for a in infoset:
-						regret[hashval][a] += aveRegret[a]
-						cumstrat[hashval][a] += (t - c_I[hashval])*sigma_player[hashval][a]
+						rtilda[a - 1] = aveRegret[a]
 
 				else: # j == 0 (i.e. first round of game)
-					# For each action available
-					for a in infoset:
-						qz = 1/(factorial(maxcard)**2) # sampling probability
-						sigma_player = sigma1
-						sigma_opponent = sigma2
-						if i == 1:
-							sigma_player = sigma2
-							sigma_opponent = sigma1
-
-						pi_opp = computePath(maxcard, sigma_opponent, Q[1 - i][:j])
-						W = utility[i]*pi_opp/qz
-	                
-						# Compute sampled counterfactual regret
-						pi_full = computePath(maxcard, sigma_player, Q[i])
-						pi_player = computePath(maxcard, sigma_player, Q[i][:j])
-						if a != Q[i][j]: # z[I]a not in z
-							if pi_full != 0:
-								rtilda = -W*pi_full/pi_player
-							else:
-								rtilda = 0
-						else:
-							pi_choice = computePath(maxcard, sigma_player, Q[i][:j + 1])
-							if pi_full != 0:
-								rtilda = W*pi_full*((1/pi_choice) - (1/pi_player))
-							else:
-								rtilda = 0
-						
-						regret[hashval][a] += rtilda
-						cumstrat[hashval][a] += (t - c_I[hashval])*sigma_player[hashval][a]
-
-				c_I[hashval] = t # update information set market
+					W = utility[i]/qz
+					reach = computePrefixPath(tables, sigma_player, Q[i])
+					pi_player = reach[j]
+					pi_choice = reach[j + 1]
+					pi_full = reach[maxcard]
+					if timed:
+						mark = profiler.lap("reach", mark)
+
+					# Sampled counterfactual regret of every action available
+					if pi_full != 0:
+						notplayed = -W*pi_full/pi_player # z[I]a not in z
+						played = W*pi_full*((1/pi_choice) - (1/pi_player))
+					else:
+						notplayed = played = 0
+					rtilda = notplayed*member[mask]
+					rtilda[Q[i][j] - 1] = played
+
+				# Accumulate regret and average strategy, update information set marker
+				rule.update(tables, mask, t, rtilda, sigma_player)
+				if timed:
+					mark = profiler.lap("regret", mark)
 
 				# Update strategy profile via regret matching
-				if i == 0:
-					for a in infoset:
-						sigma1[hashval][a] = regretMatch(regret[hashval], a)
-						if sigma1[hashval][a] > 1:
-							print("Invalid Sigma 1")
-							sys.exit() 
-				else:
-					for a in infoset:
-						sigma2[hashval][a] = regretMatch(regret[hashval], a)
-						if sigma2[hashval][a] > 1:
-							print("Invalid Sigma 2")
-							sys.exit() 
-
-				# Card actually played by player i
-				discard = Q[i][j]
-				infoset.remove(discard)
+				sigma_player[mask] = regretMatchVector(regret[mask], member[mask])
+				if timed:
+					mark = profiler.lap("matching", mark)
 
 				reward -= 1 # flip next card
 
@@ -351,6 +287,8 @@ def runAOS(player, maxcardvalue):
 				if reward == 0:
 					break
 
-	return mykey, sigma1, sigma2, regret, cumstrat, visits, regretdata
+		# Stop early when the callback asks to (e.g. a ConvergenceScheduler)
+		if onIteration is not None and onIteration(t):
+			break
 
 
@@ -1,7 +1,15 @@
 """
 Goofspiel (i.e. The Game of Pure Strategy)
 *** This is for 2 players ***
+Besides the Goofspiel object, this module is the shared scoring backend:
+scoreGame for single games, scoreBatch for arrays of games, roundPayoffs
+for per-round payoffs and payoffMatrix for the full n! x n! matrix.
 """
+from itertools import permutations
+from math import factorial
+import numpy as np
+import os
+
 class Goofspiel:
 	# Initialize Game w/ Number of Cards and Predetermined Strategies
 	def __init__(self, card_num, strat1, strat2):
@@ -46,7 +54,104 @@ class Goofspiel:
 			self.play_turn()
 
 		return self.player1_reward, self.player2_reward
-	
-	
-	
 
+"""
+scoreBatch returns the rewards of both players for a batch of games,
+where strat1 and strat2 are arrays of shape (K, n) holding the cards each
+player plays in order (leading axes broadcast against each other). The
+treasure flipped in round r is n - r.
+"""
+def scoreBatch(strat1, strat2):
+	strat1 = np.asarray(strat1)
+	strat2 = np.asarray(strat2)
+	if strat1.shape[-1] != strat2.shape[-1]:
+		raise ValueError("Invalid inputs for strategies.")
+	treasure = np.arange(strat1.shape[-1], 0, -1)
+	reward1 = (np.sign(strat1 - strat2)*treasure).sum(axis = -1)/2
+	return reward1, -reward1
+
+"""
+scoreGame returns the rewards of both players for a single game given the
+cards each plays in order. The treasure flipped in round r is n - r.
+"""
+def scoreGame(strat1, strat2):
+	reward1 = 0
+	reward2 = 0
+	treasure = len(strat1)
+	for a, b in zip(strat1, strat2):
+		if a > b:
+			reward1 += treasure/2
+			reward2 += -treasure/2
+		elif a < b:
+			reward1 += -treasure/2
+			reward2 += treasure/2
+		treasure -= 1
+	return reward1, reward2
+
+"""
+roundPayoffs returns g with g[r, a - 1, b - 1] the payoff of playing card a
+against card b in round r, when treasure n - r is at stake.
+"""
+def roundPayoffs(maxcard):
+	cards = np.arange(1, maxcard + 1)
+	treasure = np.arange(maxcard, 0, -1)
+	return treasure[:, None, None]*np.sign(cards[:, None] - cards[None, :])[None, :, :]/2
+
+"""
+allPermutations returns every card order of maxcard cards in
+lexicographic order, so row k is the order of rank k.
+"""
+def allPermutations(maxcard):
+	perms = list(permutations(range(1, maxcard + 1)))
+	return np.array(perms, dtype = np.int64).reshape(len(perms), maxcard)
+
+"""
+permutationRank returns the lexicographic rank of every card order in an
+(K, n) array, i.e. its row in allPermutations and payoffMatrix.
+"""
+def permutationRank(perms):
+	perms = np.asarray(perms)
+	n = perms.shape[-1]
+	rank = np.zeros(perms.shape[:-1], dtype = np.int64)
+	for k in range(n - 1):
+		# Lehmer code: later cards smaller than the card in position k
+		smaller = (perms[..., k + 1:] < perms[..., k:k + 1]).sum(axis = -1)
+		rank += smaller*factorial(n - 1 - k)
+	return rank
+
+PAYOFFS = {} # (maxcard, path) -> payoff matrix already loaded in this process
+
+"""
+payoffMatrix returns the n! x n! matrix of player 1's payoffs, with rows
+and columns in allPermutations order. If path is given the matrix is
+stored there as .npy on first use and memory-mapped read-only afterwards.
+"""
+def payoffMatrix(maxcard, path = None, chunk = 512):
+	key = (maxcard, path)
+	if key in PAYOFFS:
+		return PAYOFFS[key]
+	if path is not None and os.path.exists(path):
+		U = np.load(path, mmap_mode = "r")
+		# Corner Case: A stored matrix of another game size or type
+		size = factorial(maxcard)
+		if U.shape != (size, size) or U.dtype != np.float32:
+			raise ValueError(str(path) + " does not hold the float32 payoff matrix of Goofspiel(" + str(maxcard) + ").")
+		PAYOFFS[key] = U
+		return U
+
+	perms = allPermutations(maxcard)
+	size = len(perms)
+	# Payoffs are multiples of 1/2 well inside float32's exact range
+	if path is not None:
+		U = np.lib.format.open_memmap(path, mode = "w+", dtype = np.float32, shape = (size, size))
+	else:
+		U = np.empty((size, size), dtype = np.float32)
+	for start in range(0, size, chunk):
+		U[start:start + chunk] = scoreBatch(perms[start:start + chunk, None, :], perms[None, :, :])[0]
+
+	if path is not None:
+		U.flush()
+		del U
+		U = np.load(path, mmap_mode = "r")
+	PAYOFFS[key] = U
+	return U
@@ -0,0 +1,149 @@
+"""
+Index of utility-preserving alternate histories for AOS.
+For player i, an alternate history of a prefix of length j keeps player
+i's cards (in any order) and lets the opponent play any j distinct cards,
+subject to both players' prefix utilities (as computed by genRewards)
+being unchanged. The index enumerates these prefixes once per
+(player, cards held, utility) and samples uniformly from them, which is
+the distribution the original rejection sampler (Benchmark.sampleCase)
+converges to.
+
+Each key is enumerated in blocks of own orders (at most CHUNK cards scored
+at once) and stored as int32 (row, column) index arrays per utility. Keys
+with more than `limit` prefix pairs (e.g. six or more cards played at
+n >= 7) are not enumerated: draw() and sample() fall back to rejection
+sampling for them, vectorized but otherwise as in Benchmark.sampleCase.
+"""
+
+from itertools import permutations
+from math import factorial, perm
+import numpy as np
+from Goofspiel import scoreBatch, scoreGame
+from InfoSetTables import cardMask, maskCards
+from Sampling import getStream
+
+LIMIT = 1 << 21 # most (own order, opponent sequence) pairs enumerated for one key
+CHUNK = 1 << 20 # most cards scored at once while enumerating or rejection sampling
+
+class HistoryIndex:
+	# Initialize an empty index for Goofspiel(maxcard), enumerating keys of at most limit prefix pairs
+	def __init__(self, maxcard, limit = LIMIT, chunk = CHUNK):
+		self.maxcard = maxcard
+		self.limit = limit
+		self.chunk = chunk
+		self.sequences = {} # j -> every ordered choice of j distinct cards
+		self.groups = {} # (i, mask of player i's cards) -> {utility1: (own rows, opponent rows, own orders)}
+
+	# Every ordered choice of j distinct cards as a (P(n, j), j) array
+	def opponent_sequences(self, j):
+		if j not in self.sequences:
+			sequences = list(permutations(range(1, self.maxcard + 1), j))
+			self.sequences[j] = np.array(sequences, dtype = np.int64).reshape(len(sequences), j)
+		return self.sequences[j]
+
+	# Whether the prefixes of player i holding the cards in mask are few enough to enumerate
+	def indexed(self, i, mask):
+		j = bin(mask).count("1")
+		return factorial(j)*perm(self.maxcard, j) <= self.limit
+
+	# Consistent prefixes of player i holding the cards in mask, grouped by utility
+	def consistent(self, i, mask):
+		key = (i, mask)
+		if key not in self.groups:
+			# Corner Case: Too many prefixes to enumerate (draw() samples them instead)
+			if not self.indexed(i, mask):
+				raise ValueError("Too many alternate histories to index for mask " + str(mask) + ".")
+			cards = maskCards(mask)
+			j = len(cards)
+			orders = list(permutations(cards))
+			own = np.array(orders, dtype = np.int64).reshape(len(orders), j)
+			opp = self.opponent_sequences(j)
+			P = len(opp)
+
+			# Prefix utility of player 1 for blocks of own orders against every opponent sequence
+			parts = {}
+			step = max(1, self.chunk//(P*max(j, 1)))
+			for start in range(0, len(own), step):
+				block = own[start:start + step]
+				if i == 0:
+					util1, util2 = scoreBatch(block[:, None, :], opp[None, :, :])
+				else:
+					util1, util2 = scoreBatch(opp[None, :, :], block[:, None, :])
+				util1 = util1.ravel()
+				# Stable sort keeps every utility's pairs in row-major order
+				order = np.argsort(util1, kind = "stable")
+				values, first = np.unique(util1[order], return_index = True)
+				for u, pairs in zip(values.tolist(), np.split(order, first[1:])):
+					parts.setdefault(u, []).append(pairs + start*P)
+
+			groups = {}
+			for u, pairs in parts.items():
+				pairs = np.concatenate(pairs)
+				groups[u] = ((pairs//P).astype(np.int32), (pairs % P).astype(np.int32), own)
+			self.groups[key] = groups
+		return self.groups[key]
+
+	# Enumerate every key up front instead of lazily
+	def build(self):
+		for mask in range(1 << self.maxcard):
+			for i in range(2):
+				if self.indexed(i, mask):
+					self.consistent(i, mask)
+		return self
+
+	# size alternate (own, opponent) prefixes of (Q1, Q2) from player i's view, as two (size, j) arrays
+	def draw(self, Q1, Q2, i, size, stream = None):
+		own = np.array(Q1 if i == 0 else Q2, dtype = np.int64)
+		j = len(own)
+		util1 = scoreGame(Q1, Q2)[0]
+		rng = getStream(stream).rng
+		if self.indexed(i, cardMask(own)):
+			rows, cols, orders = self.consistent(i, cardMask(own))[util1]
+			k = rng.integers(len(rows), size = size)
+			return orders[rows[k]], self.opponent_sequences(j)[cols[k]]
+
+		# Rejection sampling as in Benchmark.sampleCase, in vectorized batches
+		newown = np.tile(own, (size, 1))
+		newopp = np.tile(np.array(Q2 if i == 0 else Q1, dtype = np.int64), (size, 1))
+		found = 0
+		batch = max(1, self.chunk//self.maxcard)
+		# At most limit attempts, like Benchmark.sampleCase's MAXITER
+		for attempt in range(0, max(self.limit, batch), batch):
+			a = own[np.argsort(rng.random((batch, j)), axis = 1)]
+			b = np.argsort(rng.random((batch, self.maxcard)), axis = 1)[:, :j] + 1
+			util = scoreBatch(a, b)[0] if i == 0 else scoreBatch(b, a)[0]
+			keep = np.flatnonzero(util == util1)[:size - found]
+			newown[found:found + len(keep)] = a[keep]
+			newopp[found:found + len(keep)] = b[keep]
+			found += len(keep)
+			if found == size:
+				break
+		# Histories not found keep the original prefix, as Benchmark.sampleCase does
+		return newown, newopp
+
+	# Sample an alternate history for the prefix (Q1, Q2) from player i's view, drawing from stream
+	def sample(self, Q1, Q2, i, stream = None):
+		own = Q1 if i == 0 else Q2
+		mask = cardMask(own)
+		if self.indexed(i, mask):
+			rows, cols, orders = self.consistent(i, mask)[scoreGame(Q1, Q2)[0]]
+			k = getStream(stream).randrange(len(rows))
+			newown = orders[rows[k]].tolist()
+			newopp = self.opponent_sequences(len(Q1))[cols[k]].tolist()
+		else:
+			newown, newopp = self.draw(Q1, Q2, i, 1, stream)
+			newown, newopp = newown[0].tolist(), newopp[0].tolist()
+		if i == 0:
+			return newown, newopp
+		return newopp, newown
+
+INDEXES = {} # maxcard -> HistoryIndex shared by every run in this process
+
+"""
+getIndex returns the shared HistoryIndex of Goofspiel(maxcard), creating
+it on first use.
+"""
+def getIndex(maxcard):
+	if maxcard not in INDEXES:
+		INDEXES[maxcard] = HistoryIndex(maxcard)
+	return INDEXES[maxcard]
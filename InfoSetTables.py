@@ -0,0 +1,373 @@
+"""
+Array-backed information-set tables for Goofspiel.
+An information set is the set of cards a player still holds, stored as a
+bitmask where bit (a - 1) is set iff card a is still in hand. Every table
+is a dense NumPy array of shape (2^n, n) indexed by [mask, a - 1].
+SparseInfoSetTables offers the same indexing but only allocates the rows
+of information sets that are actually visited, for large n.
+"""
+
+import numpy as np
+import math
+
+"""
+cardMask returns the bitmask of a collection of cards.
+"""
+def cardMask(cards):
+	mask = 0
+	for a in cards:
+		mask |= 1 << (a - 1)
+	return mask
+
+"""
+maskCards returns the cards held in a bitmask in increasing order.
+"""
+def maskCards(mask):
+	cards = []
+	a = 1
+	while mask:
+		if mask & 1:
+			cards.append(a)
+		mask >>= 1
+		a += 1
+	return cards
+
+"""
+genMaskTables builds the lookup tables shared by every table instance:
+the successor table (mask after playing card a), the membership table
+(whether card a is still in mask) and the popcount of every mask.
+"""
+def genMaskTables(maxcard):
+	size = 1 << maxcard
+	masks = np.arange(size, dtype = np.int64)
+	bits = np.int64(1) << np.arange(maxcard, dtype = np.int64)
+	member = (masks[:, None] & bits[None, :]) != 0
+	successor = np.where(member, masks[:, None] & ~bits[None, :], masks[:, None])
+	count = member.sum(axis = 1).astype(np.int64)
+	return successor, member, count
+
+class InfoSetTables:
+	# Initialize tables for every subset of {1, ..., maxcard}
+	def __init__(self, maxcard):
+		self.maxcard = maxcard
+		self.size = 1 << maxcard
+		self.full = self.size - 1
+		self.successor, self.member, self.count = genMaskTables(maxcard)
+
+		shape = (self.size, maxcard)
+		self.regret = np.zeros(shape) # regret tables
+		self.cumstrat = np.zeros(shape) # cumulative strategy tables
+		self.cumtotal = np.zeros(self.size) # row sums of cumstrat, the average strategy normalizer
+		# Uniform strategy over the cards still in hand
+		uniform = self.member/np.maximum(self.count, 1)[:, None]
+		self.sigma1 = uniform.copy() # strategy profile of player 1
+		self.sigma2 = uniform.copy() # strategy profile of player 2
+		self.visits = np.zeros(self.size, dtype = np.int64) # visits of information set
+		self.c_I = np.zeros(self.size, dtype = np.int64) # information set markers
+
+	# Bitmasks along a sequence of plays starting from the full hand
+	def path_masks(self, z):
+		masks = [self.full]
+		for a in z:
+			masks.append(int(self.successor[masks[-1], a - 1]))
+		return masks
+
+	# Total bytes held by the tables
+	def nbytes(self):
+		arrays = [self.regret, self.cumstrat, self.cumtotal, self.sigma1, self.sigma2,
+			self.visits, self.c_I, self.successor, self.member, self.count]
+		return sum(arr.nbytes for arr in arrays)
+
+	# Average strategy of every mask (or of the given masks), uniform where nothing was accumulated
+	def average_strategy(self, masks = None):
+		if masks is None:
+			masks = slice(None)
+		total = self.cumtotal[masks][..., None]
+		uniform = self.member[masks]/np.maximum(self.count[masks], 1)[..., None]
+		return np.where(total > 0, self.cumstrat[masks]/np.where(total > 0, total, 1), uniform)
+
+	# Convert tables into the (hash, info-set) dictionaries of the original dictionary-based code
+	def to_dicts(self):
+		mykey = {} # (hash, info-set) pairs
+		c_I = {}
+		regret = {}
+		cumstrat = {}
+		sigma1 = {}
+		sigma2 = {}
+		visits = {}
+		for mask in sorted(range(self.size), key = lambda m: (int(self.count[m]), maskCards(m))):
+			s = tuple(maskCards(mask))
+			hashval = hash(s)
+			mykey[hashval] = str(s)
+			c_I[hashval] = int(self.c_I[mask])
+			visits[hashval] = int(self.visits[mask])
+			regret[hashval] = {a: float(self.regret[mask, a - 1]) for a in s}
+			cumstrat[hashval] = {a: float(self.cumstrat[mask, a - 1]) for a in s}
+			sigma1[hashval] = {a: float(self.sigma1[mask, a - 1]) for a in s}
+			sigma2[hashval] = {a: float(self.sigma2[mask, a - 1]) for a in s}
+
+		return mykey, c_I, regret, cumstrat, sigma1, sigma2, visits
+
+class MaskBits:
+	# Successor, membership or popcount of masks, computed instead of stored
+	def __init__(self, maxcard, kind):
+		self.maxcard = maxcard
+		self.kind = kind # "successor", "member" or "count"
+		self.bits = np.int64(1) << np.arange(maxcard, dtype = np.int64)
+
+	def __getitem__(self, key):
+		if isinstance(key, tuple):
+			mask, col = key
+			if np.isscalar(mask) and np.isscalar(col):
+				bit = 1 << int(col)
+				if self.kind == "successor":
+					return int(mask) & ~bit
+				return (int(mask) & bit) != 0
+			mask = np.asarray(mask, dtype = np.int64)
+			bit = np.int64(1) << np.asarray(col, dtype = np.int64)
+			if self.kind == "successor":
+				return mask & ~bit
+			return (mask & bit) != 0
+
+		mask = np.asarray(key, dtype = np.int64)
+		member = (mask[..., None] & self.bits) != 0
+		if self.kind == "member":
+			return member
+		if self.kind == "count":
+			return member.sum(axis = -1)
+		return np.where(member, mask[..., None] & ~self.bits, mask[..., None])
+
+class LazyRows:
+	# Table rows allocated the first time an information set is touched
+	def __init__(self, default, width = None, dtype = np.float64):
+		self.default = default # masks -> initial rows
+		self.index = {} # mask -> slot in data
+		self.shape = () if width is None else (width,)
+		self.data = np.empty((16,) + self.shape, dtype = dtype)
+		self.used = 0
+
+	# Slots of the given masks, allocating rows for masks not seen before
+	def slots(self, masks):
+		if np.isscalar(masks):
+			mask = int(masks)
+			if mask not in self.index:
+				self.allocate(np.array([mask]))
+			return self.index[mask]
+		masks = np.asarray(masks, dtype = np.int64)
+		unique, inverse = np.unique(masks, return_inverse = True)
+		missing = [m for m in unique.tolist() if m not in self.index]
+		if missing:
+			self.allocate(np.array(missing, dtype = np.int64))
+		slots = np.array([self.index[m] for m in unique.tolist()], dtype = np.int64)
+		return slots[inverse].reshape(masks.shape)
+
+	def allocate(self, masks):
+		need = self.used + len(masks)
+		if need > len(self.data):
+			grown = np.empty((max(need, 2*len(self.data)),) + self.shape, dtype = self.data.dtype)
+			grown[:self.used] = self.data[:self.used]
+			self.data = grown
+		self.data[self.used:need] = self.default(masks)
+		for k, mask in enumerate(masks.tolist()):
+			self.index[mask] = self.used + k
+		self.used = need
+
+	def key(self, key):
+		if isinstance(key, tuple):
+			return (self.slots(key[0]),) + key[1:]
+		return self.slots(key)
+
+	# Resolve the slots before touching data, which allocation may replace
+	def __getitem__(self, key):
+		key = self.key(key)
+		return self.data[key]
+
+	def __setitem__(self, key, value):
+		key = self.key(key)
+		self.data[key] = value
+
+	# Add values into rows like np.add.at, allocating rows as needed
+	def add_at(self, masks, values):
+		slots = self.slots(masks)
+		np.add.at(self.data, slots, values)
+
+	# Row of mask without allocating it
+	def row(self, mask):
+		if mask in self.index:
+			return self.data[self.index[mask]]
+		return self.default(np.array([mask]))[0]
+
+class SparseInfoSetTables:
+	# Initialize empty tables; rows appear on first visit of an information set
+	def __init__(self, maxcard):
+		self.maxcard = maxcard
+		self.size = 1 << maxcard
+		self.full = self.size - 1
+		self.successor = MaskBits(maxcard, "successor")
+		self.member = MaskBits(maxcard, "member")
+		self.count = MaskBits(maxcard, "count")
+
+		zeros = lambda masks: np.zeros((len(masks), maxcard))
+		def uniform(masks):
+			member = self.member[masks]
+			return member/np.maximum(member.sum(axis = 1), 1)[:, None]
+		self.regret = LazyRows(zeros, maxcard) # regret tables
+		self.cumstrat = LazyRows(zeros, maxcard) # cumulative strategy tables
+		self.sigma1 = LazyRows(uniform, maxcard) # strategy profile of player 1
+		self.sigma2 = LazyRows(uniform, maxcard) # strategy profile of player 2
+		self.cumtotal = LazyRows(lambda masks: np.zeros(len(masks))) # row sums of cumstrat
+		counter = lambda masks: np.zeros(len(masks), dtype = np.int64)
+		self.visits = LazyRows(counter, dtype = np.int64) # visits of information set
+		self.c_I = LazyRows(counter, dtype = np.int64) # information set markers
+
+	def path_masks(self, z):
+		masks = [self.full]
+		for a in z:
+			masks.append(masks[-1] & ~(1 << (a - 1)))
+		return masks
+
+	# Total bytes held by the allocated rows
+	def nbytes(self):
+		tables = [self.regret, self.cumstrat, self.cumtotal, self.sigma1, self.sigma2, self.visits, self.c_I]
+		return sum(table.data.nbytes for table in tables)
+
+	# Average strategy of every mask (or of the given masks) without allocating rows
+	def average_strategy(self, masks = None):
+		if masks is None:
+			masks = np.arange(self.size, dtype = np.int64)
+		masks = np.asarray(masks, dtype = np.int64)
+		member = self.member[masks]
+		strategy = member/np.maximum(member.sum(axis = -1), 1)[..., None]
+		rows = self.cumtotal
+		known = np.array([m in rows.index for m in masks.ravel().tolist()], dtype = bool).reshape(masks.shape)
+		if known.any():
+			total = rows.data[rows.slots(masks[known])]
+			accumulated = total > 0
+			picked = strategy[known]
+			picked[accumulated] = self.cumstrat[masks[known][accumulated]]/total[accumulated, None]
+			strategy[known] = picked
+		return strategy
+
+	# Dense InfoSetTables holding the same values
+	def dense(self):
+		tables = InfoSetTables(self.maxcard)
+		for name in ["regret", "cumstrat", "cumtotal", "sigma1", "sigma2", "visits", "c_I"]:
+			rows = getattr(self, name)
+			masks = np.array(list(rows.index), dtype = np.int64)
+			if len(masks):
+				getattr(tables, name)[masks] = rows.data[rows.slots(masks)]
+		return tables
+
+	def to_dicts(self):
+		return self.dense().to_dicts()
+
+"""
+makeTables returns dense InfoSetTables, or SparseInfoSetTables whose rows
+are only allocated when first visited.
+"""
+def makeTables(maxcard, sparse = False):
+	if sparse:
+		return SparseInfoSetTables(maxcard)
+	return InfoSetTables(maxcard)
+
+"""
+exportTables returns the dictionary view of tables that the run functions
+return, (mykey, sigma1, sigma2, regret, cumstrat, visits), timing the
+conversion as the export phase of profiler if given.
+"""
+def exportTables(tables, profiler = None):
+	if profiler is not None:
+		mark = profiler.start()
+	mykey, c_I, regret, cumstrat, sigma1, sigma2, visits = tables.to_dicts()
+	if profiler is not None:
+		profiler.lap("export", mark)
+	return mykey, sigma1, sigma2, regret, cumstrat, visits
+
+"""
+addAt adds values into the rows of table at masks, repeated masks
+accumulating, for dense and lazily allocated tables alike.
+"""
+def addAt(table, masks, values):
+	if isinstance(table, LazyRows):
+		table.add_at(masks, values)
+	else:
+		np.add.at(table, masks, values)
+
+"""
+computeMaskPath computes the probability of ending up at prefix z[I] given
+strategy table sigma, walking the successor table instead of hashing.
+"""
+def computeMaskPath(tables, sigma, z):
+	mask = tables.full
+	prob = 1
+	for a in z:
+		prob *= sigma[mask, a - 1]
+		mask = tables.successor[mask, a - 1]
+
+	return prob
+
+"""
+computePathFactors returns the probability sigma assigns to each card of z
+at the information set where it is played.
+"""
+def computePathFactors(tables, sigma, z):
+	mask = tables.full
+	factors = []
+	for a in z:
+		factors.append(sigma[mask, a - 1])
+		mask = tables.successor[mask, a - 1]
+
+	return factors
+
+"""
+computePrefixPath returns the reach probability of every prefix of z, so
+that entry j equals computeMaskPath(tables, sigma, z[:j]).
+"""
+def computePrefixPath(tables, sigma, z):
+	prefix = [1]
+	for f in computePathFactors(tables, sigma, z):
+		prefix.append(prefix[-1]*f)
+
+	return prefix
+
+"""
+regretMatchVector returns the regret-matched strategy of one information
+set from its regret row and membership row (True for cards in hand): the
+positive regrets normalized, or uniform over the cards in hand when no
+regret is positive. Cards not in hand get probability 0. Rows are short,
+so one pass over them as Python floats beats a chain of NumPy calls.
+"""
+def regretMatchVector(row, member):
+	# Corner Case: Invalid Input
+	if len(row) != len(member):
+		raise ValueError("Regret and membership rows differ in length.")
+
+	regrets = row.tolist()
+	# Corner Case: Overflowed or undefined regrets
+	if not math.isfinite(sum(regrets)):
+		raise FloatingPointError("Regrets of the information set are not finite.")
+
+	positive = [x if x > 0 and held else 0.0 for x, held in zip(regrets, member.tolist())]
+	total = sum(positive)
+	if total > 0:
+		return np.array(positive)/total
+
+	count = int(member.sum())
+	# Corner Case: Empty information set
+	if count == 0:
+		raise ValueError("Information set has no actions.")
+	return member/count
+
+"""
+regretMatchBatch returns the regret-matched strategy rows of every
+information set in masks at once, like regretMatchVector row by row
+(the empty information set gets a row of zeros).
+"""
+def regretMatchBatch(tables, masks):
+	positive = np.maximum(tables.regret[masks], 0)*tables.member[masks]
+	total = positive.sum(axis = 1, keepdims = True)
+	# Corner Case: Overflowed or undefined regrets
+	if not np.isfinite(total).all():
+		raise FloatingPointError("Regrets of some information sets are not finite.")
+	uniform = tables.member[masks]/np.maximum(tables.count[masks], 1)[:, None]
+	return np.where(total > 0, positive/np.where(total > 0, total, 1), uniform)
@@ -2,183 +2,194 @@
 Monte Carlo CFR w/ Optimistic Averaging
 """
 
-from itertools import combinations
-from random import shuffle
 from math import factorial
-from Goofspiel import Goofspiel
-import sys
+from Goofspiel import scoreGame, scoreBatch
+from Checkpoint import loadCheckpoint, checkpointHook
+from Profiling import combineHooks
+from UpdateRules import makeRule
+from BestResponse import compileTree
+from Evaluate import sampleTrajectories
+from Sampling import getStream, makeStream
+from InfoSetTables import InfoSetTables, makeTables, addAt, maskCards, computePrefixPath, computePathFactors, regretMatchVector, regretMatchBatch, exportTables
+import numpy as np
+
+SAMPLING = ["outcome", "external"] # sampling schemes of trainMCCFR
 
 """
 sampleScheme returns random order of moves predetermined
-for both player 1 and 2 and the outcome at terminal history.
+for both player 1 and 2 and the outcome at terminal history, drawn from
+stream (the default SamplingStream if None).
 """
-def sampleScheme(maxcard):
-    Q1 = list(range(1, maxcard + 1))
-    Q2 = list(range(1, maxcard + 1))
-    shuffle(Q1)
-    shuffle(Q2)
+def sampleScheme(maxcard, stream = None):
+    stream = getStream(stream)
+    Q1 = stream.permutation(maxcard)
+    Q2 = stream.permutation(maxcard)
     Q = list(zip(Q1, Q2))
-    # Simulate a round of Goofspiel given a terminal history
-    game = Goofspiel(maxcard, Q1, Q2)
-    utility = game.play_round()
+    # Score the terminal history
+    utility = scoreGame(Q1, Q2)
     return Q, utility
 
 """
-genInitTables initializes initial info-set markers, regret tables,
-cumulative strategy tables for all Information Sets provided.
-"""
-def genInitTables(myList):
-    # Generate all subsets of a given list
-    subsetList = []
-    # Add to subsetList all possible subsets
-    for i in range(len(myList) + 1):
-        tempList = list(combinations(myList, i))
-        subsetList += tempList
-    mykey = {} # (hash, info-set) pairs
-    c_I = {} # information set markers
-    regret = {} # regret tables
-    cumstrat = {} # cumulative strategy tables
-    sigma1 = {} # strategy profile of player 1
-    sigma2 = {} # strategy profile of player 2
-    visits = {} # boolean table for visiting infosets
-
-    for s in subsetList:
-        hashval = hash(tuple(s)) # hash value for subset s
-        c_I[hashval] = 0
-        mykey[hashval] = str(s)
-        regret[hashval] = {}
-        cumstrat[hashval] = {}
-        sigma1[hashval] = {}
-        sigma2[hashval] = {}
-        visits[hashval] = 0
-        # nested dictionary for each action in subset s
-        for a in s:
-            regret[hashval][a] = 0
-            cumstrat[hashval][a] = 0
-            sigma1[hashval][a] = 1/len(s)
-            sigma2[hashval][a] = 1/len(s)
-
-    return mykey, c_I, regret, cumstrat, sigma1, sigma2, visits
-
-
-"""
-regretMatch returns the updated strategy profile after seeing
-regret on a specific information set
-"""
-def regretMatch(regret, action):
-    # Corner Case: Null Inputs
-    if (regret == None or action == None):
-        print("Null inputs.")
-        sys.exit()
-    # Corner Case: Invalid action
-    if action not in regret:
-        print("Action not in Information Set.")
-        sys.exit()
-
-    # Sum only positive regrets in regret
-    totalregret = sum(regret[i] for i in regret if regret[i] > 0)    
-
-    if totalregret > 0:
-        if regret[action] > 0:
-            return regret[action]/totalregret
-        else:
-            return 0
-    else:
-        return 1/len(regret)
-
-"""
-computePath computes the probabilibty of ending up at prefix z[I] given
-strategy sigma.
+sampleBatch returns K terminal histories at once as two (K, maxcard) arrays
+of card orders, together with the rewards of both players.
 """
-def computePath(maxcard, sigma, z):
-    actions = list(range(1, maxcard + 1))
-    prob = 1
-    for i in range(len(z)):
-        hashval = hash(tuple(actions))
-        prob *= sigma[hashval][z[i]]
-        actions.remove(z[i])
-
-    return prob
+def sampleBatch(maxcard, K, stream):
+    Q1 = stream.permutations(K, maxcard)
+    Q2 = stream.permutations(K, maxcard)
+    utility = scoreBatch(Q1, Q2)
+    return Q1, Q2, utility
 
 """
 ACTUAL GOOFSPIEL SIMULATION W/ MCCFR ALGORITHM
 """
-def runMCCFR(player, maxcardvalue):
+def runMCCFR(player, maxcardvalue, iterations = 100000, batch = 0, rng = None, checkpoint = None, every = 0, tables = None, sparse = False, profiler = None, onIteration = None, rule = None, sampling = "outcome", baselines = None):
     N = player
     maxcard = maxcardvalue
-    iterations = 100000
-    myList = list(range(1, maxcard + 1))
-    mykey, c_I, regret, cumstrat, sigma1, sigma2, visits = genInitTables(myList)
+    # Train into the caller's tables if given, so the arrays can be kept
+    if tables is None:
+        tables = makeTables(maxcard, sparse)
+    # Every sample of the run comes from this stream
+    rng = makeStream(rng)
+    rule = makeRule(rule)
+    settings = {"algorithm": "mccfr", "player": N, "maxcard": maxcard, "iterations": iterations,
+        "batch": batch, "every": every, "rule": rule.spec(), "sampling": sampling}
+    hook = combineHooks(checkpointHook(checkpoint, every, tables, settings, rng, baselines = baselines), onIteration)
+    trainMCCFR(tables, N, 0, iterations, batch, rng, hook, profiler, rule, sampling, baselines)
+
+    return exportTables(tables, profiler)
+
+"""
+resumeMCCFR continues the run saved in checkpoint file path, keeps
+checkpointing to the same file and returns what runMCCFR returns.
+state is what loadCheckpoint(path) returned, if the caller has already
+loaded it (e.g. to build its hooks on the resumed tables).
+"""
+def resumeMCCFR(path, profiler = None, onIteration = None, state = None):
+    tables, t, settings, rng, telemetry, baselines, adaptive = state if state is not None else loadCheckpoint(path)
+    hook = combineHooks(checkpointHook(path, settings["every"], tables, settings, rng, baselines = baselines), onIteration)
+    trainMCCFR(tables, settings["player"], t, settings["iterations"], settings["batch"], rng, hook, profiler,
+        settings.get("rule"), settings.get("sampling", "outcome"), baselines)
+
+    return exportTables(tables, profiler)
+
+"""
+trainMCCFR runs MCCFR iterations start, ..., stop - 1 on tables in place,
+calling onIteration(t) after every iteration if given (stopping early
+once it returns True) and charging the time of each phase to profiler if
+given. rule is an UpdateRule or its name (vanilla, i.e. the thesis's
+update, if None). sampling is "outcome" (the thesis) or "external" (see
+externalUpdate). With batch > 0 outcome sampling applies batch histories
+per player and iteration at once (see batchUpdate), and external sampling
+samples max(batch, 1) opponent orders. If baselines (a ValueBaselines) is
+given, outcome sampling uses its baseline-corrected (VR-MCCFR) regrets
+instead of the thesis's sampled ones. Every sample is drawn from rng, a
+SamplingStream or a seed for one (see makeStream).
+"""
+def trainMCCFR(tables, N, start, stop, batch = 0, rng = None, onIteration = None, profiler = None, rule = None, sampling = "outcome", baselines = None):
+    # Corner Case: Unknown sampling scheme
+    if sampling not in SAMPLING:
+        raise ValueError("Unknown sampling scheme: " + str(sampling))
+    # Corner Case: Baselines only correct outcome-sampled regrets
+    if baselines is not None and sampling != "outcome":
+        raise ValueError("Value baselines need outcome sampling.")
+    maxcard = tables.maxcard
+    rule = makeRule(rule)
+    rng = makeStream(rng)
+    if sampling == "external":
+        for t in range(start, stop):
+            externalUpdate(tables, t, max(batch, 1), rng, profiler, rule)
+            if onIteration is not None and onIteration(t):
+                break
+        return
+    regret = tables.regret
+    sigma1 = tables.sigma1
+    sigma2 = tables.sigma2
+    visits = tables.visits
+    member = tables.member
+    timed = profiler is not None
 
     # At every iteration
-    for t in range(iterations):
+    for t in range(start, stop):
         # For each player
         for i in range(N):
-            # Actions available to player
-            actions = list(range(1, maxcard + 1))
+            if timed:
+                mark = profiler.start()
+            # Batch mode: sample and update many terminal histories at once
+            if batch > 0:
+                Q1, Q2, utility = sampleBatch(maxcard, batch, rng)
+                if timed:
+                    profiler.lap("sampling", mark)
+                batchUpdate(tables, t, i, Q1, Q2, utility, profiler, rule, baselines)
+                continue
+
             # Sample terminal history from sampling scheme
-            Qzip, utility = sampleScheme(maxcard)
+            Qzip, utility = sampleScheme(maxcard, rng)
             Qunzip = list(zip(*Qzip))
             Q = [0]*2
             Q[0] = list(Qunzip[0])
             Q[1] = list(Qunzip[1])
+            # Information sets player i passes through
+            masks = tables.path_masks(Q[i])
+            qz = 1/(factorial(maxcard)**2) # sampling probability
+            sigma_player = sigma1
+            sigma_opponent = sigma2
+            if i == 1:
+                sigma_player = sigma2
+                sigma_opponent = sigma1
+            if timed:
+                mark = profiler.lap("sampling", mark)
+
+            # Opponent reach of every prefix (unchanged while player i updates)
+            pi_opps = computePrefixPath(tables, sigma_opponent, Q[1 - i])
+            # Player i's reach from each depth onward under the current strategy
+            factors = computePathFactors(tables, sigma_player, Q[i])
+            suffix = [1]*(maxcard + 1)
+            for j in reversed(range(maxcard)):
+                suffix[j] = factors[j]*suffix[j + 1]
+            # Player i's reach of the prefix, built from already updated info sets
+            pi_player = 1
+            # Baseline-corrected regrets of every depth under the current strategies
+            if baselines is not None:
+                corrected = baselines.regrets(i, tables, np.array([Q[i]]) - 1, np.array([Q[1 - i]]) - 1, sigma_player, sigma_opponent)[0]
+            if timed:
+                mark = profiler.lap("reach", mark)
 
             # At each prefix history that player i plays
             reward = maxcard
             for j in range(maxcard):
-                # Hash value for current Information Set
-                hashval = hash(tuple(actions))
-                visits[hashval] += 1
-
-                # For each action available
-                for a in actions:
-                    qz = 1/(factorial(maxcard)**2) # sampling probability
-                    sigma_player = sigma1
-                    sigma_opponent = sigma2
-                    if i == 1:
-                        sigma_player = sigma2
-                        sigma_opponent = sigma1
-       
-                    pi_opp = computePath(maxcard, sigma_opponent, Q[1 - i][:j])
-                    W = utility[i]*pi_opp/qz
-                    
-                    # Compute sampled counterfactual regret
-                    pi_full = computePath(maxcard, sigma_player, Q[i])
-                    pi_player = computePath(maxcard, sigma_player, Q[i][:j])
-                    if a != Q[i][j]: # z[I]a not in z
-                        if pi_full != 0:
-                            rtilda = -W*pi_full/pi_player
-                        else:
-                            rtilda = 0
-                    else:
-                        pi_choice = computePath(maxcard, sigma_player, Q[i][:j + 1])
-                        if pi_full != 0:
-                            rtilda = W*pi_full*((1/pi_choice) - (1/pi_player))
-                        else:
-                            rtilda = 0
-
-                    regret[hashval][a] += rtilda
-                    cumstrat[hashval][a] += (t - c_I[hashval])*sigma_player[hashval][a]       
-
-                c_I[hashval] = t # update information set marker
+                # Bitmask of current Information Set and actions available
+                mask = masks[j]
+                actions = maskCards(mask)
+                visits[mask] += 1
 
-                # Update strategy profile via regret matching
-                if i == 0:
-                    for a in actions:
-                        sigma1[hashval][a] = regretMatch(regret[hashval], a) 
-                        if sigma1[hashval][a] > 1:
-                            print("Invalid Sigma 1")
-                            sys.exit()
+                W = utility[i]*pi_opps[j]/qz
+                pi_full = pi_player*suffix[j]
+                pi_choice = pi_player*factors[j]
+
+                # Sampled counterfactual regret of every action available
+                if pi_full != 0:
+                    notplayed = -W*pi_full/pi_player # z[I]a not in z
+                    played = W*pi_full*((1/pi_choice) - (1/pi_player))
+                else:
+                    notplayed = played = 0
+                if baselines is not None:
+                    rtilda = corrected[j]
                 else:
-                    for a in actions:
-                        sigma2[hashval][a] = regretMatch(regret[hashval], a)
-                        if sigma2[hashval][a] > 1:
-                            print("Invalid Sigma 2")
-                            sys.exit()
+                    rtilda = notplayed*member[mask]
+                    rtilda[Q[i][j] - 1] = played
+
+                # Accumulate regret and average strategy, update information set marker
+                rule.update(tables, mask, t, rtilda, sigma_player)
+                if timed:
+                    mark = profiler.lap("regret", mark)
+
+                # Update strategy profile via regret matching
+                sigma_player[mask] = regretMatchVector(regret[mask], member[mask])
 
-                # Card actually played by player i
-                discard = Q[i][j]
-                actions.remove(discard)
+                # Extend the prefix reach with the freshly matched strategy
+                pi_player *= sigma_player[mask, Q[i][j] - 1]
+                if timed:
+                    mark = profiler.lap("matching", mark)
 
                 reward -= 1 # flip next card
 
@@ -186,5 +197,127 @@ def runMCCFR(player, maxcardvalue):
                 if reward == 0:
                     break
 
-    return mykey, sigma1, sigma2, regret, cumstrat, visits
+        # Stop early when the callback asks to (e.g. a ConvergenceScheduler)
+        if onIteration is not None and onIteration(t):
+            break
+
+"""
+batchUpdate applies the sampled counterfactual regrets of K terminal
+histories for player i at once. All K samples are evaluated under the
+strategy profile at the start of the batch; regrets are scatter-added and
+every visited information set is regret-matched once afterwards. With
+baselines, the baseline-corrected regrets are used instead.
+"""
+def batchUpdate(tables, t, i, Q1, Q2, utility, profiler = None, rule = None, baselines = None):
+    rule = makeRule(rule)
+    if profiler is not None:
+        mark = profiler.start()
+    K, maxcard = Q1.shape
+    qz = 1/(factorial(maxcard)**2) # sampling probability
+    Q = [Q1 - 1, Q2 - 1] # card columns
+    sigma_player = tables.sigma1
+    sigma_opponent = tables.sigma2
+    if i == 1:
+        sigma_player = tables.sigma2
+        sigma_opponent = tables.sigma1
+
+    # Information sets along every sampled history of both players
+    masks = [np.empty((K, maxcard + 1), dtype = np.int64) for p in range(2)]
+    for p in range(2):
+        masks[p][:, 0] = tables.full
+        for j in range(maxcard):
+            masks[p][:, j + 1] = tables.successor[masks[p][:, j], Q[p][:, j]]
+
+    # Prefix reach products of both players
+    ones = np.ones((K, 1))
+    f_player = sigma_player[masks[i][:, :-1], Q[i]]
+    f_opp = sigma_opponent[masks[1 - i][:, :-1], Q[1 - i]]
+    reach = np.hstack([ones, np.cumprod(f_player, axis = 1)])
+    reach_opp = np.hstack([ones, np.cumprod(f_opp, axis = 1)])
+
+    pi_player = reach[:, :-1]
+    pi_choice = reach[:, 1:]
+    pi_full = reach[:, -1:]
+    W = utility[i][:, None]*reach_opp[:, :-1]/qz
+    live = pi_full > 0
+    # -W*pi_full/pi_player for every action, plus W*pi_full/pi_choice on the played card
+    notplayed = -W*np.divide(pi_full, pi_player, out = np.zeros_like(pi_player), where = live)
+    played = W*np.divide(pi_full, pi_choice, out = np.zeros_like(pi_choice), where = live)
+    if profiler is not None:
+        mark = profiler.lap("reach", mark)
+
+    infosets = masks[i][:, :-1].ravel()
+    if baselines is not None:
+        rtilda = baselines.regrets(i, tables, Q[i], Q[1 - i], sigma_player, sigma_opponent).reshape(K*maxcard, maxcard)
+    else:
+        rtilda = notplayed.ravel()[:, None]*tables.member[infosets]
+        rtilda[np.arange(K*maxcard), Q[i].ravel()] += played.ravel()
+
+    addAt(tables.visits, infosets, 1)
+
+    # Regret, optimistic averaging and regret matching, once per visited information set
+    visited = rule.update_batch(tables, t, infosets, rtilda, sigma_player, addAt)
+    if profiler is not None:
+        mark = profiler.lap("regret", mark)
+
+    sigma_player[visited] = regretMatchBatch(tables, visited)
+    if profiler is not None:
+        profiler.lap("matching", mark)
+
+"""
+sampleOrders returns K card orders (as card columns, shape (K, maxcard))
+drawn from strategy table sigma with the generator of stream rng, using
+the inverse-CDF sampler of Evaluate.sampleTrajectories.
+"""
+def sampleOrders(tables, sigma, K, rng):
+    return sampleTrajectories(sigma, tables.maxcard, K, rng.rng) - 1
+
+"""
+externalUpdate runs external-sampling MCCFR iteration t for both players:
+each traverser samples K card orders of its opponent from the opponent's
+strategy and enumerates all of its own plays. Its information sets do not
+see the opponent's cards, so the traversal is the dynamic program of
+VanillaCFR against the empirical round marginals of the K samples, which
+updates every information set without the 1/qz importance weights of
+outcome sampling. Like trainCFR, both players' regrets go into the shared
+tables at once as the rule's iteration t + 1, and both strategies are
+averaged weighted by their own reach.
+"""
+def externalUpdate(tables, t, K, rng, profiler = None, rule = None):
+    # Corner Case: Lazily allocated tables
+    if not isinstance(tables, InfoSetTables):
+        raise ValueError("External sampling needs dense InfoSetTables.")
+    rule = makeRule(rule)
+    if profiler is not None:
+        mark = profiler.start()
+    tree = compileTree(tables.maxcard)
+    masks = tree.masks
+    rounds = np.arange(tables.maxcard)
+
+    # Empirical round marginals of K sampled orders of each player
+    P = []
+    for sigma in (tables.sigma1, tables.sigma2):
+        counts = np.zeros((tables.maxcard, tables.maxcard))
+        np.add.at(counts, (np.broadcast_to(rounds, (K, tables.maxcard)), sampleOrders(tables, sigma, K, rng)), 1)
+        P.append(counts/K)
+    if profiler is not None:
+        mark = profiler.lap("sampling", mark)
+
+    reach1 = tree.reach(tables.sigma1)
+    reach2 = tree.reach(tables.sigma2)
+    if profiler is not None:
+        mark = profiler.lap("reach", mark)
+
+    # Sampled counterfactual regrets of both traversers, with the other one sampled
+    regret = tree.regrets(tables.sigma1, P[1]) + tree.regrets(tables.sigma2, P[0])
+    strategy = reach1[:, None]*tables.sigma1 + reach2[:, None]*tables.sigma2
+    rule.update_batch(tables, t + 1, masks, regret[masks], strategy, addAt)
+    tables.visits[masks] += 1
+    if profiler is not None:
+        mark = profiler.lap("regret", mark)
 
+    # Update strategy profile via regret matching
+    tables.sigma1[masks] = regretMatchBatch(tables, masks)
+    tables.sigma2[masks] = tables.sigma1[masks]
+    if profiler is not None:
+        profiler.lap("matching", mark)
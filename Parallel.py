@@ -0,0 +1,120 @@
+"""
+Parallel MCCFR/AOS training with periodic regret/strategy merges.
+Every worker process owns a private copy of the tables and its own
+SamplingStream, spawned from the run's seed. Each round, all workers run the same block of `sync` iterations on
+different samples; their regret, cumulative strategy and visit deltas are
+summed into the global tables, and fresh sigmas are regret-matched from
+the merged regrets and sent back for the next round.
+"""
+
+from multiprocessing import Process, Pipe
+import numpy as np
+from InfoSetTables import InfoSetTables, regretMatchBatch
+from MCCFR import trainMCCFR
+from FinalAlgorithm import trainAOS
+from Telemetry import RegretTelemetry
+from Sampling import SamplingStream
+
+"""
+runWorker keeps a private set of tables and trains on the blocks of
+iterations it receives until it is sent None.
+"""
+def runWorker(conn, algorithm, N, maxcard, batch, stream, window = 100, reservoir = 0):
+	tables = InfoSetTables(maxcard)
+
+	while True:
+		message = conn.recv()
+		if message is None:
+			break
+		start, stop, regret, sigma1, sigma2, c_I = message
+
+		# Start the block from the merged global state
+		tables.regret[:] = regret
+		tables.sigma1[:] = sigma1
+		tables.sigma2[:] = sigma2
+		tables.c_I[:] = c_I
+		tables.cumstrat[:] = 0
+		tables.cumtotal[:] = 0
+		tables.visits[:] = 0
+
+		# Open telemetry windows of this block, merged by the parent
+		telemetry = RegretTelemetry(window = window, reservoir = reservoir, seed = stream.rng.integers(1 << 63))
+		if algorithm == "mccfr":
+			trainMCCFR(tables, N, start, stop, batch, stream)
+		else:
+			trainAOS(tables, N, start, stop, telemetry, rng = stream)
+
+		conn.send((tables.regret - regret, tables.cumstrat, tables.cumtotal, tables.visits, tables.c_I, telemetry))
+
+	conn.close()
+
+"""
+runParallel trains `algorithm` ("mccfr" or "aos") for the given number of
+iterations with `workers` processes merging every `sync` iterations, and
+returns the same values as runMCCFR/runAOS.
+"""
+def runParallel(algorithm, player, maxcardvalue, iterations, workers, sync, seed = None, batch = 0, telemetry = None):
+	# Corner Case: Invalid Input
+	if algorithm not in ("mccfr", "aos"):
+		raise ValueError("Unknown algorithm: " + str(algorithm))
+	if workers < 1 or sync < 1:
+		raise ValueError("workers and sync must be positive.")
+
+	N = player
+	maxcard = maxcardvalue
+	tables = InfoSetTables(maxcard)
+	# Child streams of the workers, and one more for the reservoir of the merged telemetry
+	streams = SamplingStream(seed).spawn(workers + 1)
+	# Streaming aggregates of player 1's sampled regrets (AOS)
+	if telemetry is None:
+		telemetry = RegretTelemetry(seed = streams[-1].rng.integers(1 << 63))
+
+	# Start workers, each with its own child stream
+	conns = []
+	procs = []
+	for w in range(workers):
+		parent, child = Pipe()
+		proc = Process(target = runWorker, args = (child, algorithm, N, maxcard, batch, streams[w], telemetry.window, telemetry.reservoir))
+		proc.start()
+		child.close()
+		conns.append(parent)
+		procs.append(proc)
+
+	try:
+		for start in range(0, iterations, sync):
+			stop = min(start + sync, iterations)
+			for conn in conns:
+				conn.send((start, stop, tables.regret, tables.sigma1, tables.sigma2, tables.c_I))
+
+			# Reduce worker deltas into the global tables
+			c_I = tables.c_I.copy()
+			for conn in conns:
+				dregret, dcumstrat, dcumtotal, dvisits, worker_c_I, worker_telemetry = conn.recv()
+				tables.regret += dregret
+				tables.cumstrat += dcumstrat
+				tables.cumtotal += dcumtotal
+				tables.visits += dvisits
+				np.maximum(c_I, worker_c_I, out = c_I)
+				telemetry.merge(worker_telemetry)
+			tables.c_I[:] = c_I
+			telemetry.advance(stop)
+
+			# Fresh strategy profile from the merged regrets
+			masks = np.arange(tables.size)
+			tables.sigma1[:] = regretMatchBatch(tables, masks)
+			tables.sigma2[:] = tables.sigma1
+	finally:
+		for conn in conns:
+			try:
+				conn.send(None)
+			except (BrokenPipeError, OSError): # worker already exited
+				pass
+			conn.close()
+		for proc in procs:
+			proc.join()
+
+	mykey, c_I, regret, cumstrat, sigma1, sigma2, visits = tables.to_dicts()
+	if algorithm == "mccfr":
+		return mykey, sigma1, sigma2, regret, cumstrat, visits
+	telemetry.finish()
+	return mykey, sigma1, sigma2, regret, cumstrat, visits, telemetry
@@ -0,0 +1,190 @@
+"""
+Frozen average-strategy policy files for serving trained strategies.
+exportPolicy compiles a (2^n, n) strategy table (e.g. averageStrategy of
+the trained tables) into one read-only binary file holding, per
+information set mask, the probability row plus Walker/Vose alias tables
+over the cards still in hand. Policy maps the file into memory, so
+loading does not depend on its size, and sample() picks a card with one
+uniform, one table slot and one comparison: O(1) per move, with no lists
+or arrays built.
+
+File layout (little endian, every section padded to 8 bytes):
+	header       magic "GOOFPOL1", version, maxcard (uint32 each after the magic)
+	probability  float64 (2^n, n)  strategy[mask, a - 1]
+	threshold    float64 (2^n, n)  acceptance threshold of alias slot j
+	cards        int8    (2^n, n)  column of the j-th card in hand
+	alias        int8    (2^n, n)  column taken when slot j is rejected
+	count        int8    (2^n,)    cards in hand, i.e. alias slots used
+"""
+
+import os
+import mmap
+import struct
+import numpy as np
+from InfoSetTables import genMaskTables
+from Sampling import getStream
+
+MAGIC = b"GOOFPOL1"
+VERSION = 1
+HEADER = struct.Struct("<8sII")
+MAXCARD_LIMIT = 24 # cards fit int8 columns; 2^24 masks is already ~3GB of policy
+
+"""
+policyLayout returns the (offset, dtype, shape) of every section of the
+policy file of Goofspiel(maxcard), and the file size.
+"""
+def policyLayout(maxcard):
+	size = 1 << maxcard
+	sections = [("probability", np.float64, (size, maxcard)), ("threshold", np.float64, (size, maxcard)),
+		("cards", np.int8, (size, maxcard)), ("alias", np.int8, (size, maxcard)), ("count", np.int8, (size,))]
+	layout = {}
+	offset = HEADER.size
+	for name, dtype, shape in sections:
+		layout[name] = (offset, dtype, shape)
+		offset += -(-int(np.prod(shape))*np.dtype(dtype).itemsize//8)*8
+	return layout, offset
+
+"""
+aliasTables returns the Walker/Vose alias tables (threshold, alias) of the
+probabilities p: slot j of len(p) equally likely slots keeps j with
+probability threshold[j] and takes alias[j] otherwise.
+"""
+def aliasTables(p):
+	k = len(p)
+	scaled = [x*k for x in p]
+	threshold = [1.0]*k
+	alias = list(range(k))
+	small = [j for j in range(k) if scaled[j] < 1]
+	large = [j for j in range(k) if scaled[j] >= 1]
+	while small and large:
+		j = small.pop()
+		l = large[-1]
+		threshold[j] = scaled[j]
+		alias[j] = l
+		scaled[l] -= 1 - scaled[j]
+		if scaled[l] < 1:
+			small.append(large.pop())
+	# Whatever is left is 1 up to rounding
+	return threshold, alias
+
+"""
+exportPolicy writes the strategy table (2^n, n) of Goofspiel(maxcard) to
+the policy file path, renormalizing every row over the cards in hand, and
+returns path. The file is replaced atomically.
+"""
+def exportPolicy(path, strategy, maxcard):
+	strategy = np.asarray(strategy, dtype = np.float64)
+	successor, member, count = genMaskTables(maxcard)
+	# Corner Case: Invalid Input
+	if maxcard < 1 or maxcard > MAXCARD_LIMIT:
+		raise ValueError("maxcard must be between 1 and " + str(MAXCARD_LIMIT) + ".")
+	if strategy.shape != member.shape:
+		raise ValueError("strategy must have shape " + str(member.shape) + ".")
+	if not np.all(np.isfinite(strategy)) or np.any(strategy < 0):
+		raise ValueError("strategy must be finite and nonnegative.")
+	# Corner Case: Probability on cards already played, or none on the cards in hand
+	if np.any(strategy[~member] > 0):
+		raise ValueError("strategy plays cards that are not in hand.")
+	total = strategy.sum(axis = 1)
+	if np.any(total[1:] <= 0):
+		raise ValueError("strategy has an information set without any probability.")
+
+	probability = strategy/np.where(total > 0, total, 1)[:, None]
+	threshold = np.ones(member.shape)
+	cards = np.zeros(member.shape, dtype = np.int8)
+	alias = np.zeros(member.shape, dtype = np.int8)
+	for mask in range(1, len(count)):
+		cols = np.flatnonzero(member[mask])
+		k = len(cols)
+		cards[mask, :k] = cols
+		t, l = aliasTables(probability[mask, cols].tolist())
+		threshold[mask, :k] = t
+		alias[mask, :k] = cols[l]
+
+	layout, end = policyLayout(maxcard)
+	arrays = {"probability": probability, "threshold": threshold, "cards": cards,
+		"alias": alias, "count": count.astype(np.int8)}
+	tmp = path + ".tmp"
+	with open(tmp, "wb") as f:
+		f.write(HEADER.pack(MAGIC, VERSION, maxcard))
+		for name, (offset, dtype, shape) in layout.items():
+			f.seek(offset)
+			f.write(np.ascontiguousarray(arrays[name], dtype = np.dtype(dtype).newbyteorder("<")).tobytes())
+		f.truncate(end)
+	os.replace(tmp, path)
+	return path
+
+class Policy:
+	# Read-only memory map of the policy file at path
+	def __init__(self, path):
+		with open(path, "rb") as f:
+			self.file = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+		# Corner Case: Not a policy file, or one this code cannot read
+		if len(self.file) < HEADER.size:
+			raise ValueError("Not a policy file: " + str(path))
+		magic, version, maxcard = HEADER.unpack_from(self.file)
+		if magic != MAGIC:
+			raise ValueError("Not a policy file: " + str(path))
+		if version != VERSION:
+			raise ValueError("Unsupported policy file version: " + str(version))
+		layout, end = policyLayout(maxcard)
+		if len(self.file) != end:
+			raise ValueError("Truncated or corrupt policy file: " + str(path))
+
+		self.path = path
+		self.maxcard = maxcard
+		self.size = 1 << maxcard
+		self.full = self.size - 1
+		# Zero-copy NumPy views for vectorized use (e.g. evaluateStrategy(policy.table, ...))
+		self.arrays = {name: np.frombuffer(self.file, dtype = np.dtype(dtype).newbyteorder("<"),
+			count = int(np.prod(shape)), offset = offset).reshape(shape) for name, (offset, dtype, shape) in layout.items()}
+		self.table = self.arrays["probability"]
+		# Flat memoryviews for the scalar per-move path; indexing them returns plain Python numbers
+		view = memoryview(self.file)
+		def flat(name, code):
+			offset, dtype, shape = layout[name]
+			return view[offset:offset + int(np.prod(shape))*np.dtype(dtype).itemsize].cast(code)
+		self.thresholds = flat("threshold", "d")
+		self.cards = flat("cards", "b")
+		self.aliases = flat("alias", "b")
+		self.counts = flat("count", "b")
+		self.probabilities = flat("probability", "d")
+		self.views = [view, self.thresholds, self.cards, self.aliases, self.counts, self.probabilities]
+
+	# Card played at information set mask for a uniform u in [0, 1)
+	def sample(self, mask, u):
+		x = u*self.counts[mask]
+		j = int(x)
+		slot = mask*self.maxcard + j
+		if x - j < self.thresholds[slot]:
+			return self.cards[slot] + 1
+		return self.aliases[slot] + 1
+
+	# Card played at information set mask, drawing the uniform from stream (the default stream if None)
+	def play(self, mask, stream = None):
+		return self.sample(mask, getStream(stream).random())
+
+	# Probability of playing card a at information set mask
+	def probability(self, mask, a):
+		return self.probabilities[mask*self.maxcard + a - 1]
+
+	# Cards played at the information sets masks for uniforms u, both arrays
+	def sample_batch(self, masks, u):
+		x = u*self.arrays["count"][masks]
+		j = x.astype(np.int64)
+		keep = x - j < self.arrays["threshold"][masks, j]
+		return np.where(keep, self.arrays["cards"][masks, j], self.arrays["alias"][masks, j]).astype(np.int64) + 1
+
+	# Release the views and the memory map; arrays taken from self.table must be released first
+	def close(self):
+		self.arrays = self.table = None
+		for view in reversed(self.views):
+			view.release()
+		self.views = []
+		self.file.close()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
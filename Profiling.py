@@ -0,0 +1,109 @@
+"""
+Instrumentation for MCCFR/AOS training.
+A Profiler accumulates wall-clock time per phase of an iteration
+(sampling, reach computation, regret update, regret matching, export)
+plus named counters, and can forward every timed phase to a listener.
+The engines only touch it behind `if profiler is not None`, so a run
+without one pays a single comparison per phase. Progress is a
+per-iteration callback that prints at most once per interval, with rate,
+ETA and table memory.
+"""
+
+import time
+
+PHASES = ["sampling", "reach", "regret", "matching", "export"]
+
+class Profiler:
+	# Start with empty timers; listener(phase, seconds) sees every timed phase
+	def __init__(self, listener = None):
+		self.listener = listener
+		self.seconds = {phase: 0.0 for phase in PHASES} # cumulative time per phase
+		self.calls = {phase: 0 for phase in PHASES} # timed sections per phase
+		self.counters = {} # name -> count
+
+	# Current time, to be passed to the next lap
+	def start(self):
+		return time.perf_counter()
+
+	# Charge the time since mark to phase and return the new mark
+	def lap(self, phase, mark):
+		now = time.perf_counter()
+		self.seconds[phase] = self.seconds.get(phase, 0.0) + now - mark
+		self.calls[phase] = self.calls.get(phase, 0) + 1
+		if self.listener is not None:
+			self.listener(phase, now - mark)
+		return now
+
+	def count(self, name, k = 1):
+		self.counters[name] = self.counters.get(name, 0) + k
+
+	# Timers, counters and (if tables is given) table memory as a dict
+	def report(self, tables = None):
+		total = sum(self.seconds.values())
+		phases = {}
+		for phase in self.seconds:
+			phases[phase] = {"seconds": self.seconds[phase], "calls": self.calls[phase],
+				"share": self.seconds[phase]/total if total > 0 else 0.0}
+		report = {"phases": phases, "counters": dict(self.counters)}
+		if tables is not None:
+			report["table_bytes"] = tables.nbytes()
+		return report
+
+	# Printable summary of report()
+	def format(self, tables = None):
+		report = self.report(tables)
+		lines = ["%-10s %10.3fs %6.1f%% %10d calls" % (phase, r["seconds"], 100*r["share"], r["calls"])
+			for phase, r in report["phases"].items()]
+		lines += ["%-10s %d" % (name, count) for name, count in report["counters"].items()]
+		if "table_bytes" in report:
+			lines.append("tables     %.1f MB" % (report["table_bytes"]/2**20))
+		return "\n".join(lines)
+
+class Progress:
+	# Report iteration t of total at most once every `interval` seconds
+	def __init__(self, total, start = 0, interval = 10.0, tables = None):
+		self.total = total
+		self.first = start # first iteration of this run
+		self.interval = interval
+		self.tables = tables
+		self.began = time.perf_counter()
+		self.next = self.began + interval
+
+	def __call__(self, t):
+		now = time.perf_counter()
+		if now < self.next and t + 1 < self.total:
+			return
+		self.next = now + self.interval
+		done = t + 1 - self.first
+		rate = done/max(now - self.began, 1e-9)
+		line = "Iteration %d/%d (%.1f%%), %.1f it/s, ETA %s" % (t + 1, self.total,
+			100*(t + 1)/max(self.total, 1), rate, formatSeconds((self.total - t - 1)/rate))
+		if self.tables is not None:
+			line += ", tables %.1f MB" % (self.tables.nbytes()/2**20)
+		print(line)
+
+"""
+formatSeconds returns seconds as h:mm:ss.
+"""
+def formatSeconds(seconds):
+	seconds = int(round(seconds))
+	return "%d:%02d:%02d" % (seconds//3600, seconds//60 % 60, seconds % 60)
+
+"""
+combineHooks returns a per-iteration callback calling every given hook
+in order and asking to stop training if any of them does (by returning
+True), or None if none is given.
+"""
+def combineHooks(*hooks):
+	hooks = [hook for hook in hooks if hook is not None]
+	if not hooks:
+		return None
+	if len(hooks) == 1:
+		return hooks[0]
+
+	def hook(t):
+		stop = False
+		for h in hooks:
+			stop = h(t) or stop
+		return stop
+	return hook
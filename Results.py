@@ -0,0 +1,121 @@
+"""
+Results writer for MCCFR/AOS runs.
+Tables are written column-wise, either as a compressed .npz of the dense
+(2^n, n) arrays or as a long Parquet table with one row per
+(information set, action). The per-window AOS regret summaries of a
+RegretTelemetry (and its reservoir samples, if any) go to their own files.
+Excel output is available as a separate conversion step.
+"""
+
+import numpy as np
+from InfoSetTables import maskCards
+
+"""
+averageStrategy normalizes the cumulative strategy table into the average
+strategy by the normalizer the engines keep incrementally, using the
+uniform strategy where nothing was accumulated.
+"""
+def averageStrategy(tables):
+	return tables.average_strategy()
+
+"""
+infosetNames returns the printable information set of every mask, matching
+the keys of the old Excel key book.
+"""
+def infosetNames(tables):
+	return np.array([str(tuple(maskCards(mask))) for mask in range(tables.size)])
+
+"""
+writeResults writes tables (and telemetry summaries if given) under the base path
+in format "npz" or "parquet", and returns the paths written.
+"""
+def writeResults(path, tables, telemetry = None, format = "npz"):
+	# Corner Case: Invalid format
+	if format not in ("npz", "parquet"):
+		raise ValueError("Unknown results format: " + str(format))
+
+	avestrat = averageStrategy(tables)
+	paths = []
+	if format == "npz":
+		paths.append(path + ".npz")
+		np.savez_compressed(paths[-1], infoset = infosetNames(tables),
+			sigma1 = tables.sigma1, sigma2 = tables.sigma2, regret = tables.regret,
+			cumstrat = tables.cumstrat, avestrat = avestrat,
+			visits = tables.visits, c_I = tables.c_I)
+	else:
+		pa, pq = requireArrow()
+		# One row per (information set, action still in hand)
+		masks, cols = np.nonzero(tables.member)
+		columns = {
+			"mask": masks,
+			"infoset": infosetNames(tables)[masks],
+			"action": cols + 1,
+			"sigma1": tables.sigma1[masks, cols],
+			"sigma2": tables.sigma2[masks, cols],
+			"regret": tables.regret[masks, cols],
+			"cumstrat": tables.cumstrat[masks, cols],
+			"avestrat": avestrat[masks, cols],
+			"visits": tables.visits[masks],
+		}
+		paths.append(path + ".parquet")
+		pq.write_table(pa.table(columns), paths[-1])
+
+	if telemetry is not None:
+		paths.append(writeTable(path + "_regretdata", telemetry.summary(), format))
+		samples = telemetry.reservoir_samples()
+		if len(samples):
+			paths.append(writeTable(path + "_regretsamples", samples, format))
+
+	return paths
+
+"""
+writeTable writes the structured array rows to path as .npy or .parquet
+and returns the path written.
+"""
+def writeTable(path, rows, format = "npz"):
+	if format == "npz":
+		path += ".npy"
+		np.save(path, rows)
+	else:
+		pa, pq = requireArrow()
+		path += ".parquet"
+		pq.write_table(pa.table({name: rows[name] for name in rows.dtype.names}), path)
+
+	return path
+
+"""
+requireArrow imports pyarrow, which is only needed for Parquet output.
+"""
+def requireArrow():
+	try:
+		import pyarrow as pa
+		import pyarrow.parquet as pq
+	except ImportError:
+		raise ImportError("Parquet output requires pyarrow; use format = 'npz' instead.")
+	return pa, pq
+
+"""
+convertToExcel rewrites an .npz results file in the old Excel layout
+(one sheet per table, one column per information set). Requires pandas
+and openpyxl.
+"""
+def convertToExcel(path, xlsx, regretpath = None):
+	import pandas as pd
+
+	with np.load(path) as data:
+		names = data["infoset"]
+		member = [np.array(maskCards(m), dtype = np.int64) - 1 for m in range(len(names))]
+		def sheet(table):
+			return pd.DataFrame({names[m]: pd.Series(table[m, cols], index = cols + 1) for m, cols in enumerate(member)})
+
+		with pd.ExcelWriter(xlsx) as file:
+			pd.DataFrame([dict(enumerate(names))]).to_excel(file, sheet_name = "Key Book", index = False)
+			sheet(data["sigma1"]).to_excel(file, sheet_name = "Player 1 Strategies", index = False)
+			sheet(data["sigma2"]).to_excel(file, sheet_name = "Player 2 Strategies", index = False)
+			sheet(data["regret"]).to_excel(file, sheet_name = "Overall Regrets", index = False)
+			sheet(data["cumstrat"]).to_excel(file, sheet_name = "Cumulative Strategy", index = False)
+			sheet(data["avestrat"]).to_excel(file, sheet_name = "Average Strategy", index = False)
+			pd.DataFrame([dict(zip(names, data["visits"]))]).to_excel(file, sheet_name = "Visits", index = False)
+			if regretpath is not None:
+				rows = pd.DataFrame(np.load(regretpath))
+				rows.to_excel(file, sheet_name = "Regret Data", index = False)
@@ -0,0 +1,129 @@
+"""
+Seedable sampling service for every sampling path of MCCFR/AOS.
+A SamplingStream wraps a numpy.random.Generator and hands out card
+orders and uniforms from blocks drawn `block` at a time, so the per-draw
+cost in the scalar training loops is a list lookup instead of a call into
+the random module. Streams are built from a SeedSequence, so a run is
+reproduced from its seed, spawn() gives independent child streams (e.g.
+one per worker process), and state()/from_state() restore a stream,
+buffered blocks included, so checkpointed runs resume bit-for-bit.
+"""
+
+import numpy as np
+
+class SamplingStream:
+	# Stream seeded by seed (None, an int or a SeedSequence), drawing `block` values at a time
+	def __init__(self, seed = None, block = 4096):
+		# Corner Case: Invalid Input
+		if block < 1:
+			raise ValueError("block must be positive.")
+
+		if not isinstance(seed, np.random.SeedSequence):
+			seed = np.random.SeedSequence(seed)
+		self.seed = seed
+		self.block = block
+		self.rng = np.random.Generator(np.random.PCG64(seed))
+		self.buffers = {} # key -> [pre-drawn values, next position, generator state they were drawn from]
+
+	# Draw a fresh block for key ("random" or "permutation <n>") from the generator
+	def fill(self, key):
+		state = self.rng.bit_generator.state
+		if key == "random":
+			values = self.rng.random(self.block).tolist()
+		else:
+			n = int(key.split()[1])
+			values = (np.argsort(self.rng.random((self.block, n)), axis = 1) + 1).tolist()
+		self.buffers[key] = [values, 0, state]
+
+	# Next pre-drawn value of key
+	def next(self, key):
+		buffer = self.buffers.get(key)
+		if buffer is None or buffer[1] == len(buffer[0]):
+			self.fill(key)
+			buffer = self.buffers[key]
+		buffer[1] += 1
+		return buffer[0][buffer[1] - 1]
+
+	# Uniform float in [0, 1)
+	def random(self):
+		return self.next("random")
+
+	# Uniform integer in [0, k)
+	def randrange(self, k):
+		return min(int(self.random()*k), k - 1)
+
+	# Uniformly random order of the cards 1, ..., n as a new list
+	def permutation(self, n):
+		return list(self.next("permutation %d" % n))
+
+	# Uniformly random order of the given items as a new list
+	def shuffled(self, items):
+		items = list(items)
+		return [items[k - 1] for k in self.next("permutation %d" % len(items))]
+
+	# K uniformly random orders of the cards 1, ..., n as a (K, n) array, drawn at once
+	def permutations(self, K, n):
+		return np.argsort(self.rng.random((K, n)), axis = 1) + 1
+
+	# K uniform floats in [0, 1) as an array, drawn at once
+	def uniforms(self, K):
+		return self.rng.random(K)
+
+	# k independent child streams
+	def spawn(self, k):
+		return [SamplingStream(seed, self.block) for seed in self.seed.spawn(k)]
+
+	# JSON-friendly state: seed, generator and the position in every buffered block
+	def state(self):
+		return {"entropy": str(self.seed.entropy), "spawn_key": list(self.seed.spawn_key),
+			"children": self.seed.n_children_spawned, "block": self.block,
+			"rng": self.rng.bit_generator.state,
+			"buffers": [[key, buffer[1], buffer[2]] for key, buffer in self.buffers.items()]}
+
+	# Restore from state(), redrawing the buffered blocks from the generator states they came from
+	@classmethod
+	def from_state(cls, state):
+		seed = np.random.SeedSequence(int(state["entropy"]), spawn_key = tuple(state["spawn_key"]),
+			n_children_spawned = state["children"])
+		stream = cls(seed, state["block"])
+		if state["rng"]["bit_generator"] != "PCG64":
+			stream.rng = np.random.Generator(getattr(np.random, state["rng"]["bit_generator"])())
+		for key, position, drawn in state["buffers"]:
+			stream.rng.bit_generator.state = drawn
+			stream.fill(key)
+			stream.buffers[key][1] = position
+		stream.rng.bit_generator.state = state["rng"]
+		return stream
+
+STREAM = SamplingStream() # default stream of the helpers called without one
+
+"""
+seedStream reseeds the default stream used by helpers called without a
+stream, like random.seed did for the global random module.
+"""
+def seedStream(seed = None, block = 4096):
+	global STREAM
+	STREAM = SamplingStream(seed, block)
+	return STREAM
+
+"""
+getStream returns stream, or the default stream if stream is None.
+"""
+def getStream(stream = None):
+	if stream is None:
+		return STREAM
+	return stream
+
+"""
+makeStream returns a SamplingStream for seed: a stream is returned as is,
+None, an int or a SeedSequence seed a new one, and a numpy Generator is
+used as the stream's generator.
+"""
+def makeStream(seed = None):
+	if isinstance(seed, SamplingStream):
+		return seed
+	if isinstance(seed, np.random.Generator):
+		stream = SamplingStream(seed.bit_generator.seed_seq)
+		stream.rng = seed
+		return stream
+	return SamplingStream(seed)
@@ -0,0 +1,181 @@
+"""
+Convergence-driven scheduling of MCCFR/AOS/CFR training.
+ConvergenceScheduler is a per-iteration callback that measures a metric
+every `every` iterations and asks the engine to stop (by returning True)
+once the metric has been at most `target` for `patience` checks in a
+row, so the iteration count of a run becomes an upper bound:
+
+exploitability  exact exploitability of the average strategy
+change          largest total variation distance between the average
+                strategies of an information set at two successive checks
+variance        largest relative variance of AOS's averaged regret
+                estimates over the depths, from an AdaptiveBudget
+
+AdaptiveBudget replaces AOS's fixed budget of MAXITER/FACTOR + 1
+alternate histories per depth. It tracks moving averages of the
+per-history regret variance and of the squared averaged regrets of every
+depth, and averages just enough histories for the standard error of the
+averaged regrets to be `tolerance` times their typical size, never more
+than the thesis's budget. With tolerance None it only measures.
+"""
+
+import math
+import numpy as np
+from BestResponse import exploitability
+
+METRICS = ["exploitability", "change", "variance"]
+
+class ConvergenceScheduler:
+	# Stop training once metric (measured every `every` iterations) is at most target for `patience` checks
+	def __init__(self, tables, metric = "exploitability", target = 0.01, every = 1000, patience = 1, minimum = 0, source = None):
+		# Corner Case: Invalid Input
+		if metric not in METRICS:
+			raise ValueError("Unknown convergence metric: " + str(metric))
+		if every < 1 or patience < 1:
+			raise ValueError("every and patience must be positive.")
+		# Corner Case: The variance metric needs an AdaptiveBudget to read it from
+		if metric == "variance" and not hasattr(source, "variances"):
+			raise ValueError("The variance metric needs an AdaptiveBudget source.")
+
+		self.tables = tables
+		self.metric = metric
+		self.target = target
+		self.every = every
+		self.patience = patience
+		self.minimum = minimum # iterations always run
+		self.source = source
+		self.history = [] # (iterations run, metric) of every check
+		self.last = None # average strategy at the previous check
+		self.hits = 0 # successive checks at or below target
+		self.stopped = None # iterations run when training was stopped
+
+	def __call__(self, t):
+		if (t + 1) % self.every != 0:
+			return False
+		value = self.measure()
+		self.history.append((t + 1, value))
+		if t + 1 >= self.minimum and value <= self.target:
+			self.hits += 1
+		else:
+			self.hits = 0
+		if self.hits >= self.patience:
+			self.stopped = t + 1
+			return True
+		return False
+
+	# Current value of the metric
+	def measure(self):
+		if self.metric == "variance":
+			variances = self.source.variances()
+			return float(np.max(variances)) if len(variances) else math.inf
+
+		strategy = self.tables.average_strategy()
+		if self.metric == "exploitability":
+			return exploitability(strategy, strategy, self.tables.maxcard)
+		# Nothing to compare with at the first check
+		change = math.inf
+		if self.last is not None:
+			change = float((np.abs(strategy - self.last).sum(axis = 1)/2).max())
+		self.last = strategy
+		return change
+
+	# Printable history of the checks
+	def format(self):
+		lines = ["iteration  %s" % self.metric]
+		for t, value in self.history:
+			lines.append("%9d  %.6g" % (t, value))
+		if self.stopped is not None:
+			lines.append("Converged (%s <= %g) after %d iterations" % (self.metric, self.target, self.stopped))
+		return "\n".join(lines)
+
+class AdaptiveBudget:
+	# Per-depth AOS history budgets for Goofspiel(maxcard), aiming at a relative standard error of tolerance
+	def __init__(self, maxcard, tolerance = 0.1, minimum = 16, decay = 0.05, warmup = 4):
+		# Corner Case: Invalid Input
+		if tolerance is not None and tolerance <= 0:
+			raise ValueError("tolerance must be positive (or None to only measure).")
+		if minimum < 2 or warmup < 1 or not 0 < decay <= 1:
+			raise ValueError("minimum must be at least 2, warmup positive and decay in (0, 1].")
+
+		self.maxcard = maxcard
+		self.tolerance = tolerance
+		self.minimum = minimum # fewest histories averaged once adapted
+		self.decay = decay
+		self.warmup = warmup # observations of a depth before its budget adapts
+		self.variance = np.zeros(maxcard) # moving average of the per-history regret variance of every depth
+		self.scale = np.zeros(maxcard) # moving average of the squared averaged regrets of every depth
+		self.seen = np.zeros(maxcard, dtype = np.int64) # observations of every depth
+		self.sizes = np.zeros(maxcard, dtype = np.int64) # histories last averaged at every depth
+		self.caps = np.zeros(maxcard, dtype = np.int64) # the thesis's budget of every depth
+		self.histories = np.zeros(maxcard, dtype = np.int64) # histories averaged at every depth in total
+
+	# Settings that from_state/the resume functions turn back into this budget
+	def spec(self):
+		return {"tolerance": self.tolerance, "minimum": self.minimum, "decay": self.decay, "warmup": self.warmup}
+
+	# Histories to average at depth j, at most cap
+	def size(self, j, cap):
+		size = cap
+		if self.tolerance is not None and self.seen[j] >= self.warmup:
+			# Regrets that never vary (e.g. with one card left) need the fewest histories
+			if self.variance[j] == 0:
+				size = min(self.minimum, cap)
+			elif self.scale[j] > 0:
+				size = math.ceil(self.variance[j]/(self.tolerance**2*self.scale[j]))
+				size = min(max(size, self.minimum), cap)
+		self.sizes[j] = size
+		self.caps[j] = cap
+		return size
+
+	# Fold in the regrets averaged at depth j, one sequence of sampled regrets per card in hand
+	def observe(self, j, samples):
+		samples = np.asarray(samples, dtype = np.float64)
+		self.histories[j] += samples.shape[1]
+		# Corner Case: A single history says nothing about the variance
+		if samples.shape[1] < 2:
+			return
+		self.seen[j] += 1
+		step = max(1/self.seen[j], self.decay)
+		self.variance[j] += step*(samples.var(axis = 1, ddof = 1).mean() - self.variance[j])
+		self.scale[j] += step*((samples.mean(axis = 1)**2).mean() - self.scale[j])
+
+	# Relative variance of the averaged regrets at depth j (0 if they never vary)
+	def relative(self, j):
+		if self.variance[j] == 0:
+			return 0.0
+		if self.sizes[j] == 0 or self.scale[j] == 0:
+			return math.inf
+		return self.variance[j]/(self.sizes[j]*self.scale[j])
+
+	# Relative variance of the averaged regrets of every depth observed so far
+	def variances(self):
+		return np.array([self.relative(j) for j in range(self.maxcard) if self.seen[j] > 0])
+
+	# Per depth: histories averaged last and in total, the thesis's budget and the relative standard error
+	def report(self):
+		rows = []
+		for j in range(1, self.maxcard):
+			error = math.sqrt(self.relative(j)) if self.seen[j] > 0 else float("nan")
+			rows.append({"depth": j, "size": int(self.sizes[j]), "cap": int(self.caps[j]),
+				"histories": int(self.histories[j]), "error": error})
+		return rows
+
+	# Printable summary of report()
+	def format(self):
+		lines = ["depth   budget      cap    histories  rel. error"]
+		for r in self.report():
+			lines.append("%5d %8d %8d %12d %11.4g" % (r["depth"], r["size"], r["cap"], r["histories"], r["error"]))
+		return "\n".join(lines)
+
+	# JSON-friendly state for checkpoints
+	def state(self):
+		return {"spec": self.spec(), "maxcard": self.maxcard, "variance": self.variance.tolist(),
+			"scale": self.scale.tolist(), "seen": self.seen.tolist(), "sizes": self.sizes.tolist(),
+			"caps": self.caps.tolist(), "histories": self.histories.tolist()}
+
+	@classmethod
+	def from_state(cls, state):
+		budget = cls(state["maxcard"], **state["spec"])
+		for name in ["variance", "scale", "seen", "sizes", "caps", "histories"]:
+			getattr(budget, name)[:] = state[name]
+		return budget
@@ -0,0 +1,97 @@
+"""
+Periodic average-strategy snapshots for convergence curves.
+StrategySnapshots is a per-iteration callback (like Progress or the
+checkpoint hook) that reads tables.average_strategy() every `every`
+iterations and keeps it as float32. With delta = True (the default) only
+the rows that changed since the previous snapshot are kept, so late in a
+run, when most information sets have settled, a snapshot costs a few rows
+instead of a copy of the table. Snapshots are replayed in order to
+rebuild each strategy, e.g. to plot exploitability over iterations:
+
+	curve = snapshots.curve(lambda strategy: exploitability(strategy, strategy, maxcard))
+"""
+
+import numpy as np
+
+class StrategySnapshots:
+	# Snapshot the average strategy of tables after every `every` iterations
+	def __init__(self, tables, every, delta = True):
+		# Corner Case: Invalid Input
+		if every < 1:
+			raise ValueError("every must be positive.")
+
+		self.tables = tables
+		self.maxcard = tables.maxcard
+		self.every = every
+		self.delta = delta
+		self.iterations = [] # iterations completed at every snapshot
+		self.masks = [] # information sets stored by every snapshot
+		self.rows = [] # their float32 average strategies
+		self.last = None # strategy at the previous snapshot
+
+	def __call__(self, t):
+		if (t + 1) % self.every == 0:
+			self.record(t + 1)
+
+	# Snapshot the current average strategy as the one after iteration t
+	def record(self, t):
+		current = self.tables.average_strategy().astype(np.float32)
+		if self.delta and self.last is not None:
+			masks = np.flatnonzero((current != self.last).any(axis = 1))
+		else:
+			masks = np.arange(len(current))
+		self.iterations.append(int(t))
+		self.masks.append(masks)
+		self.rows.append(current[masks])
+		self.last = current
+
+	def __len__(self):
+		return len(self.iterations)
+
+	# (iteration, float32 strategy) of every snapshot in order, rebuilt in one pass
+	def __iter__(self):
+		strategy = np.zeros((1 << self.maxcard, self.maxcard), dtype = np.float32)
+		for t, masks, rows in zip(self.iterations, self.masks, self.rows):
+			strategy[masks] = rows
+			yield t, strategy.copy()
+
+	# Strategy of snapshot k
+	def strategy(self, k):
+		for j, (t, strategy) in enumerate(self):
+			if j == k:
+				return strategy
+		raise IndexError("snapshot index out of range")
+
+	# [(iteration, fn(strategy))] over every snapshot
+	def curve(self, fn):
+		return [(t, fn(strategy)) for t, strategy in self]
+
+	# Bytes held by the stored snapshots
+	def nbytes(self):
+		return sum(masks.nbytes + rows.nbytes for masks, rows in zip(self.masks, self.rows))
+
+	# Write the snapshots to the .npz file path
+	def save(self, path):
+		sizes = np.array([len(masks) for masks in self.masks], dtype = np.int64)
+		empty = np.zeros((0, self.maxcard), dtype = np.float32)
+		np.savez_compressed(path, iterations = np.array(self.iterations, dtype = np.int64), sizes = sizes,
+			masks = np.concatenate(self.masks) if self.masks else np.zeros(0, dtype = np.int64),
+			rows = np.concatenate(self.rows) if self.rows else empty,
+			settings = np.array([self.maxcard, self.every, int(self.delta)]))
+
+	# Snapshots read back from save(), without tables to record more
+	@classmethod
+	def load(cls, path):
+		with np.load(path) as data:
+			maxcard, every, delta = data["settings"].tolist()
+			snapshots = cls.__new__(cls)
+			snapshots.tables = None
+			snapshots.maxcard = maxcard
+			snapshots.every = every
+			snapshots.delta = bool(delta)
+			snapshots.iterations = data["iterations"].tolist()
+			bounds = np.cumsum(data["sizes"])[:-1]
+			snapshots.masks = np.split(data["masks"], bounds)
+			snapshots.rows = np.split(data["rows"], bounds)
+			snapshots.last = None
+		return snapshots
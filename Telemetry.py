@@ -0,0 +1,319 @@
+"""
+Bounded-memory telemetry of AOS sampled regrets.
+Instead of keeping every sampled regret of every iteration, RegretTelemetry
+keeps streaming aggregates per (window of iterations, depth): count, mean
+and variance (Welford/Chan updates), min/max, a relative-error quantile
+sketch and optionally a fixed-size reservoir sample. A window is closed
+into one summary row once training has moved past it, and closed rows are
+appended to a CSV file every few windows, so memory stays flat however
+long the run.
+"""
+
+import numpy as np
+import json
+import math
+import os
+from Sampling import getStream
+
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95) # quantiles reported per window
+
+class QuantileSketch:
+	# Log-spaced histogram whose quantiles are within `accuracy` relative error
+	def __init__(self, accuracy = 0.01):
+		self.accuracy = accuracy
+		self.gamma = (1 + accuracy)/(1 - accuracy)
+		self.lngamma = math.log(self.gamma)
+		self.positive = {} # bin -> count of values in (gamma^(k-1), gamma^k]
+		self.negative = {} # bin -> count of values in [-gamma^k, -gamma^(k-1))
+		self.zeros = 0
+		self.count = 0
+
+	# Bin the magnitudes of values into store
+	def bin(self, store, values):
+		keys, counts = np.unique(np.ceil(np.log(values)/self.lngamma).astype(np.int64), return_counts = True)
+		for k, c in zip(keys.tolist(), counts.tolist()):
+			store[k] = store.get(k, 0) + c
+
+	def add(self, values):
+		values = np.asarray(values, dtype = np.float64)
+		self.bin(self.positive, values[values > 0])
+		self.bin(self.negative, -values[values < 0])
+		self.zeros += int((values == 0).sum())
+		self.count += len(values)
+
+	def merge(self, other):
+		for store, theirs in [(self.positive, other.positive), (self.negative, other.negative)]:
+			for k, c in theirs.items():
+				store[k] = store.get(k, 0) + c
+		self.zeros += other.zeros
+		self.count += other.count
+
+	# Representative value of bin k
+	def value(self, k):
+		return 2*self.gamma**k/(self.gamma + 1)
+
+	def quantile(self, q):
+		if self.count == 0:
+			return float("nan")
+		rank = q*(self.count - 1)
+		seen = 0
+		# Most negative values first, then zeros, then positive values
+		for k in sorted(self.negative, reverse = True):
+			seen += self.negative[k]
+			if seen > rank:
+				return -self.value(k)
+		seen += self.zeros
+		if seen > rank:
+			return 0.0
+		for k in sorted(self.positive):
+			seen += self.positive[k]
+			if seen > rank:
+				return self.value(k)
+		return self.value(max(self.positive))
+
+	def state(self):
+		return {"accuracy": self.accuracy, "zeros": self.zeros, "count": self.count,
+			"positive": list(self.positive.items()), "negative": list(self.negative.items())}
+
+	@classmethod
+	def from_state(cls, state):
+		sketch = cls(state["accuracy"])
+		sketch.positive = {k: c for k, c in state["positive"]}
+		sketch.negative = {k: c for k, c in state["negative"]}
+		sketch.zeros = state["zeros"]
+		sketch.count = state["count"]
+		return sketch
+
+class WindowStats:
+	# Streaming aggregates of the regrets of one (window, depth)
+	def __init__(self, accuracy = 0.01, reservoir = 0):
+		self.count = 0
+		self.mean = 0.0
+		self.m2 = 0.0 # sum of squared deviations from the mean
+		self.min = math.inf
+		self.max = -math.inf
+		self.sketch = QuantileSketch(accuracy)
+		self.size = reservoir # reservoir capacity (0 disables sampling)
+		self.reservoir = []
+
+	# Combine count/mean/m2 of another stream (Chan et al.)
+	def combine(self, count, mean, m2):
+		total = self.count + count
+		delta = mean - self.mean
+		self.mean += delta*count/total
+		self.m2 += m2 + delta**2*self.count*count/total
+		self.count = total
+
+	def add(self, values, rng):
+		values = np.asarray(values, dtype = np.float64)
+		if len(values) == 0:
+			return
+		mean = values.mean()
+		seen = self.count
+		self.combine(len(values), mean, ((values - mean)**2).sum())
+		self.min = min(self.min, values.min())
+		self.max = max(self.max, values.max())
+		self.sketch.add(values)
+
+		# Algorithm R: value number s is kept with probability size/(s + 1)
+		if self.size > 0:
+			slots = rng.integers(0, seen + np.arange(len(values)) + 1)
+			for s, value in enumerate(values.tolist()):
+				if seen + s < self.size:
+					self.reservoir.append(value)
+				elif slots[s] < self.size:
+					self.reservoir[slots[s]] = value
+
+	def merge(self, other, rng):
+		if other.count == 0:
+			return
+		seen = self.count
+		self.combine(other.count, other.mean, other.m2)
+		self.min = min(self.min, other.min)
+		self.max = max(self.max, other.max)
+		self.sketch.merge(other.sketch)
+
+		# Draw the merged reservoir from both in proportion to their streams
+		if self.size > 0:
+			mine = rng.permutation(self.reservoir).tolist()
+			theirs = rng.permutation(other.reservoir).tolist()
+			size = min(self.size, len(mine) + len(theirs))
+			take = min(rng.binomial(size, seen/self.count), len(mine))
+			take = max(take, size - len(theirs))
+			self.reservoir = mine[:take] + theirs[:size - take]
+
+	def variance(self):
+		if self.count < 2:
+			return 0.0
+		return self.m2/(self.count - 1)
+
+	def state(self):
+		return {"count": self.count, "mean": self.mean, "m2": self.m2,
+			"min": self.min, "max": self.max, "size": self.size,
+			"reservoir": self.reservoir, "sketch": self.sketch.state()}
+
+	@classmethod
+	def from_state(cls, state):
+		stats = cls(reservoir = state["size"])
+		stats.count = state["count"]
+		stats.mean = state["mean"]
+		stats.m2 = state["m2"]
+		stats.min = state["min"]
+		stats.max = state["max"]
+		stats.reservoir = state["reservoir"]
+		stats.sketch = QuantileSketch.from_state(state["sketch"])
+		return stats
+
+class RegretTelemetry:
+	# Aggregate regrets per `window` iterations, writing to path + ".csv" if path is given
+	def __init__(self, path = None, window = 100, reservoir = 0, every = 10, accuracy = 0.01, seed = None):
+		# Corner Case: Invalid Input
+		if window < 1 or every < 1 or reservoir < 0:
+			raise ValueError("window and every must be positive and reservoir non-negative.")
+
+		self.path = path
+		self.window = window
+		self.reservoir = reservoir # samples kept per (window, depth)
+		self.every = every # closed windows between flushes
+		self.accuracy = accuracy
+		# Reservoir draws are seeded from the default stream unless given a seed
+		if seed is None:
+			seed = getStream().rng.integers(1 << 63)
+		self.rng = np.random.default_rng(seed)
+		self.open = {} # (window, depth) -> WindowStats
+		self.rows = [] # closed summary rows not yet written
+		self.samples = [] # reservoir rows (iteration, depth, value) not yet written
+		self.closed = 0 # windows closed since the last flush
+		self.names = ["iteration", "depth", "count", "mean", "variance", "min", "max"]
+		self.names += ["q%02d" % round(100*q) for q in QUANTILES]
+
+		# A new run starts new output files
+		for name in self.files():
+			if os.path.exists(name):
+				os.remove(name)
+
+	# Output files of this telemetry
+	def files(self):
+		if self.path is None:
+			return []
+		return [self.path + ".csv", self.path + "_samples.csv"]
+
+	# Record the regrets sampled at depth j of iteration t
+	def record(self, t, j, values):
+		key = (t//self.window, j)
+		if key not in self.open:
+			self.open[key] = WindowStats(self.accuracy, self.reservoir)
+		self.open[key].add(values, self.rng)
+
+	# Fold the open windows of another telemetry (e.g. a worker's) into this one
+	def merge(self, other):
+		for key, stats in other.open.items():
+			if key not in self.open:
+				self.open[key] = WindowStats(self.accuracy, self.reservoir)
+			self.open[key].merge(stats, self.rng)
+
+	# Close every window that ends at or before iteration t
+	def advance(self, t):
+		done = sorted(key for key in self.open if (key[0] + 1)*self.window <= t)
+		windows = set()
+		for w, j in done:
+			stats = self.open.pop((w, j))
+			start = w*self.window
+			self.rows.append([start, j, stats.count, stats.mean, stats.variance(), stats.min, stats.max]
+				+ [stats.sketch.quantile(q) for q in QUANTILES])
+			self.samples += [(start, j, value) for value in stats.reservoir]
+			windows.add(w)
+
+		self.closed += len(windows)
+		if self.closed >= self.every:
+			self.flush()
+
+	# Append the closed rows to disk (kept in memory when there is no path)
+	def flush(self):
+		self.closed = 0
+		if self.path is None:
+			return
+		summary, samples = self.files()
+		appendRows(summary, self.rows, self.names)
+		appendRows(samples, self.samples, ["iteration", "depth", "value"])
+		self.rows = []
+		self.samples = []
+
+	# Close every window and flush
+	def finish(self):
+		self.advance(math.inf)
+		self.flush()
+
+	# Closed summary rows as a structured array
+	def summary(self):
+		return readRows(self.path and self.files()[0], self.rows, self.names)
+
+	# Closed reservoir samples as a structured array
+	def reservoir_samples(self):
+		return readRows(self.path and self.files()[1], self.samples, ["iteration", "depth", "value"])
+
+	# JSON-friendly state, including how far the output files have been written
+	def state(self):
+		offsets = {}
+		for name in self.files():
+			offsets[name] = os.path.getsize(name) if os.path.exists(name) else 0
+		return {"path": self.path, "window": self.window, "reservoir": self.reservoir,
+			"every": self.every, "accuracy": self.accuracy, "closed": self.closed,
+			"rng": self.rng.bit_generator.state, "rows": self.rows, "samples": self.samples,
+			"open": [[w, j, stats.state()] for (w, j), stats in self.open.items()],
+			"offsets": offsets}
+
+	# Restore from state(), truncating output written after it was taken
+	@classmethod
+	def from_state(cls, state):
+		telemetry = cls(None, state["window"], state["reservoir"], state["every"], state["accuracy"])
+		telemetry.path = state["path"]
+		telemetry.rng.bit_generator.state = state["rng"]
+		telemetry.closed = state["closed"]
+		telemetry.rows = state["rows"]
+		telemetry.samples = [tuple(row) for row in state["samples"]]
+		telemetry.open = {(w, j): WindowStats.from_state(stats) for w, j, stats in state["open"]}
+		for name, offset in state["offsets"].items():
+			if os.path.exists(name):
+				with open(name, "r+b") as f:
+					f.truncate(offset)
+		return telemetry
+
+	def dumps(self):
+		return json.dumps(self.state())
+
+	@classmethod
+	def loads(cls, text):
+		return cls.from_state(json.loads(text))
+
+"""
+appendRows appends rows to the CSV file at name, writing the header if
+the file is new or empty.
+"""
+def appendRows(name, rows, names):
+	if not rows:
+		return
+	header = not os.path.exists(name) or os.path.getsize(name) == 0
+	with open(name, "a") as f:
+		np.savetxt(f, np.array(rows, dtype = np.float64).reshape(len(rows), len(names)),
+			delimiter = ",", fmt = "%.17g", header = ",".join(names) if header else "", comments = "")
+
+"""
+readRows returns the rows of the CSV file at name followed by the rows
+still in memory, as a structured array with fields names.
+"""
+def readRows(name, rows, names):
+	dtype = np.dtype([(field, np.float64) for field in names])
+	parts = []
+	if name is not None and os.path.exists(name) and os.path.getsize(name) > 0:
+		data = np.loadtxt(name, delimiter = ",", skiprows = 1, ndmin = 2)
+		parts.append(data)
+	if rows:
+		parts.append(np.array(rows, dtype = np.float64).reshape(len(rows), len(names)))
+	if not parts:
+		return np.empty(0, dtype = dtype)
+	data = np.vstack(parts)
+	out = np.empty(len(data), dtype = dtype)
+	for k, field in enumerate(names):
+		out[field] = data[:, k]
+	return out
@@ -0,0 +1,238 @@
+"""
+Round-robin tournaments between pools of Goofspiel strategies.
+Entrants are (2^n, n) strategy tables loaded from checkpoints, results
+files, policy files or baseline bots, e.g. several MCCFR/AOS checkpoints
+with both their current and average strategies. Every pairing is scored:
+
+- expected payoffs are always exact, from the round marginals of both
+  strategies (as in BestResponse.expectedPayoff), for all pairings at once;
+- win/loss/tie probabilities are exact for n <= MATRIX_LIMIT, contracting
+  the n! x n! payoff matrix with every entrant's card-order probabilities
+  in a few matrix products, and otherwise sampled in batches, with the
+  pairings spread over a process pool and every pairing drawing from its
+  own child SamplingStream, so results do not depend on the worker count.
+
+Goofspiel is symmetric and zero-sum, so only pairings i <= j are played
+and the rest of the table is mirrored.
+
+	python Tournament.py --maxcard 5 --workers 4 run1.npz run1.npz:sigma1 MCCFR_Results.npz uniform highest
+"""
+
+import os
+import argparse
+from multiprocessing import Pool
+import numpy as np
+from Goofspiel import roundPayoffs, payoffMatrix
+from Evaluate import MATRIX_LIMIT, uniformStrategy, evaluateStrategy, permutationProbs
+from BestResponse import roundMarginals
+from InfoSetTables import genMaskTables
+from Checkpoint import loadCheckpoint
+from Policy import Policy
+from Sampling import SamplingStream
+
+BOTS = ["uniform", "highest", "lowest"] # baseline bots available by name
+TABLES = ["average", "sigma1", "sigma2"] # strategies a checkpoint or results file provides
+
+"""
+botStrategy returns the table of a baseline bot: "uniform" plays every
+card in hand with equal probability, "highest" always plays its highest
+card (matching the prizes, which are flipped from highest to lowest) and
+"lowest" always plays its lowest card.
+"""
+def botStrategy(name, maxcard):
+	# Corner Case: Unknown bot
+	if name not in BOTS:
+		raise ValueError("Unknown bot: " + str(name))
+	if name == "uniform":
+		return uniformStrategy(maxcard)
+
+	successor, member, count = genMaskTables(maxcard)
+	cols = np.arange(maxcard)
+	if name == "highest":
+		pick = np.where(member, cols, -1).argmax(axis = 1)
+	else:
+		pick = np.where(member, cols, maxcard).argmin(axis = 1)
+	strategy = np.zeros(member.shape)
+	strategy[np.arange(len(pick)), pick] = member[np.arange(len(pick)), pick]
+	return strategy
+
+"""
+loadStrategy returns the strategy table named by spec: a bot name, a
+policy file (.pol), or a checkpoint or results .npz optionally followed by
+":average" (the default), ":sigma1" or ":sigma2".
+"""
+def loadStrategy(spec, maxcard):
+	if spec in BOTS:
+		return botStrategy(spec, maxcard)
+	path, which = spec, "average"
+	head, sep, tail = spec.rpartition(":")
+	if sep and tail in TABLES:
+		path, which = head, tail
+	# Corner Case: Missing file
+	if not os.path.exists(path):
+		raise ValueError("No such strategy file or bot: " + str(spec))
+
+	if path.endswith(".pol"):
+		with Policy(path) as policy:
+			strategy = policy.table.copy()
+	else:
+		with np.load(path, allow_pickle = False) as data:
+			checkpoint = "iteration" in data.files
+			if not checkpoint:
+				strategy = data["avestrat" if which == "average" else which].copy()
+		if checkpoint:
+			tables = loadCheckpoint(path)[0]
+			strategy = tables.average_strategy() if which == "average" else getattr(tables, which).copy()
+
+	# Corner Case: Strategy of another game size
+	if strategy.shape != (1 << maxcard, maxcard):
+		raise ValueError(str(spec) + " is not a strategy for Goofspiel(" + str(maxcard) + ").")
+	return strategy
+
+"""
+expectedPayoffs returns the matrix of player 1's exact expected payoffs
+for every pair of strategies.
+"""
+def expectedPayoffs(strategies, maxcard):
+	P = np.array([roundMarginals(strategy, maxcard) for strategy in strategies])
+	return np.einsum("ira,rab,jrb->ij", P, roundPayoffs(maxcard), P)
+
+"""
+exactOutcomes returns the exact win, loss and tie probability matrices of
+every pair of strategies, contracting the payoff matrix (memory-mapped at
+path if given) in row blocks of `chunk` card orders.
+"""
+def exactOutcomes(strategies, maxcard, chunk = 512, path = None):
+	probs = np.array([permutationProbs(strategy, maxcard)[1] for strategy in strategies])
+	U = payoffMatrix(maxcard, path)
+	win = np.zeros((len(strategies), len(strategies)))
+	tie = np.zeros_like(win)
+	for start in range(0, len(U), chunk):
+		block = np.asarray(U[start:start + chunk])
+		left = probs[:, start:start + chunk]
+		win += (left @ (block > 0).astype(np.float64)) @ probs.T
+		tie += (left @ (block == 0).astype(np.float64)) @ probs.T
+	return win, win.T.copy(), tie
+
+POOL = {} # strategies, maxcard and games of this pool worker
+
+"""
+initWorker stores what every pairing of the tournament needs once per
+worker process.
+"""
+def initWorker(strategies, maxcard, games):
+	POOL["strategies"] = strategies
+	POOL["maxcard"] = maxcard
+	POOL["games"] = games
+
+"""
+playPairing samples the games of strategy i against strategy j with
+stream and returns (i, j, evaluateStrategy result).
+"""
+def playPairing(task):
+	i, j, stream = task
+	strategies = POOL["strategies"]
+	return i, j, evaluateStrategy(strategies[i], POOL["maxcard"], POOL["games"], strategies[j], stream.rng)
+
+"""
+sampledOutcomes returns sampled win, loss and tie rate matrices of every
+pair of strategies and their 95% confidence half-widths, playing `games`
+games per pairing over `workers` processes.
+"""
+def sampledOutcomes(strategies, maxcard, games, workers = 1, seed = None):
+	K = len(strategies)
+	pairs = [(i, j) for i in range(K) for j in range(i, K)]
+	streams = SamplingStream(seed).spawn(len(pairs))
+	tasks = [(i, j, stream) for (i, j), stream in zip(pairs, streams)]
+	if workers > 1:
+		with Pool(workers, initWorker, (strategies, maxcard, games)) as pool:
+			results = pool.map(playPairing, tasks)
+	else:
+		initWorker(strategies, maxcard, games)
+		results = [playPairing(task) for task in tasks]
+
+	rates = {name: np.zeros((K, K)) for name in ["win", "loss", "tie", "win_ci", "loss_ci", "tie_ci"]}
+	for i, j, result in results:
+		for name, mirror in [("win", "loss"), ("loss", "win"), ("tie", "tie")]:
+			rates[name][i, j] = rates[mirror][j, i] = result[name]
+			rates[name + "_ci"][i, j] = rates[mirror + "_ci"][j, i] = result[name + "_ci"]
+	return rates
+
+"""
+runTournament plays every pairing of the named strategies (a dict name ->
+table, or a list of tables) and returns the names and the matrices of
+player 1's expected payoff and win/loss/tie probabilities, row entrant
+against column entrant. Outcomes are exact if `exact` (by default for
+n <= MATRIX_LIMIT) and otherwise sampled from `games` games per pairing
+over `workers` processes.
+"""
+def runTournament(strategies, maxcard, games = 100000, workers = 1, seed = None, exact = None, path = None):
+	if isinstance(strategies, dict):
+		names, strategies = list(strategies), list(strategies.values())
+	else:
+		names = ["strategy %d" % k for k in range(len(strategies))]
+	strategies = [np.asarray(strategy, dtype = np.float64) for strategy in strategies]
+	if exact is None:
+		exact = maxcard <= MATRIX_LIMIT
+	# Corner Case: Invalid Input
+	if len(strategies) == 0:
+		raise ValueError("A tournament needs at least one strategy.")
+	if any(strategy.shape != (1 << maxcard, maxcard) for strategy in strategies):
+		raise ValueError("Every strategy must have shape " + str((1 << maxcard, maxcard)) + ".")
+	if exact and maxcard > MATRIX_LIMIT:
+		raise ValueError("Exact outcomes need maxcard <= " + str(MATRIX_LIMIT) + ".")
+	if not exact and games < 1:
+		raise ValueError("games must be positive.")
+
+	result = {"names": names, "exact": exact, "payoff": expectedPayoffs(strategies, maxcard)}
+	if exact:
+		result["win"], result["loss"], result["tie"] = exactOutcomes(strategies, maxcard, path = path)
+	else:
+		result.update(sampledOutcomes(strategies, maxcard, games, workers, seed))
+		result["games"] = games
+	return result
+
+"""
+standings returns the entrants ordered by their mean expected payoff
+against the rest of the field, as (name, mean payoff, mean win rate) rows.
+"""
+def standings(result):
+	K = len(result["names"])
+	others = ~np.eye(K, dtype = bool) if K > 1 else np.ones((1, 1), dtype = bool)
+	payoff = np.where(others, result["payoff"], 0).sum(axis = 1)/others.sum(axis = 1)
+	win = np.where(others, result["win"], 0).sum(axis = 1)/others.sum(axis = 1)
+	order = np.argsort(-payoff, kind = "stable")
+	return [(result["names"][k], float(payoff[k]), float(win[k])) for k in order]
+
+"""
+formatTournament returns a printable payoff table and the standings.
+"""
+def formatTournament(result):
+	names = result["names"]
+	width = max(8, max(len(name) for name in names))
+	lines = ["Expected payoff (row vs. column), " + ("exact outcomes" if result["exact"] else "%d sampled games per pairing" % result["games"])]
+	lines.append(" "*width + "".join(" %9d" % k for k in range(len(names))))
+	for k, name in enumerate(names):
+		lines.append(name.ljust(width) + "".join(" %9.4f" % v for v in result["payoff"][k]))
+	lines.append("")
+	lines.append("rank " + "entrant".ljust(width) + "    payoff   win %")
+	for rank, (name, payoff, win) in enumerate(standings(result)):
+		lines.append("%4d " % (rank + 1) + name.ljust(width) + " %9.4f %7.2f" % (payoff, 100*win))
+	return "\n".join(lines)
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser()
+	parser.add_argument("entrants", nargs = "+", help = "bots (" + ", ".join(BOTS) + "), .pol files, or checkpoint/results .npz files with optional :" + "/:".join(TABLES))
+	parser.add_argument("--maxcard", type = int, default = 5, help = "number of cards per player")
+	parser.add_argument("--games", type = int, default = 100000, help = "sampled games per pairing when outcomes are not exact")
+	parser.add_argument("--sampled", action = "store_true", help = "sample outcomes even when they can be computed exactly")
+	parser.add_argument("--workers", type = int, default = os.cpu_count(), help = "processes playing sampled pairings")
+	parser.add_argument("--seed", type = int, help = "seed of the sampled games")
+	parser.add_argument("--output", help = "also write the result matrices to this .npz file")
+	args = parser.parse_args()
+
+	strategies = {spec: loadStrategy(spec, args.maxcard) for spec in args.entrants}
+	result = runTournament(strategies, args.maxcard, args.games, args.workers, args.seed, False if args.sampled else None)
+	print(formatTournament(result))
+	if args.output is not None:
+		np.savez_compressed(args.output, **{name: np.asarray(value) for name, value in result.items()})
@@ -0,0 +1,148 @@
+"""
+Regret and average-strategy update rules for MCCFR/AOS.
+Every rule is applied lazily per information set, like the thesis's
+optimistic averaging: when an information set is updated at iteration t
+and was last updated at iteration c = c_I[mask], everything the rule
+would have done to it at iterations c+1, ..., t is applied at once.
+
+vanilla  plain regret accumulation and average weight t - c (the thesis)
+cfr+     regret-matching+ (accumulated regrets clipped at 0) with linear averaging
+linear   linear CFR: iteration k's regrets and strategy weighted by k
+dcfr     discounted CFR: after iteration k positive regrets are multiplied
+         by k^alpha/(k^alpha + 1), negative ones by k^beta/(k^beta + 1), and
+         the strategy of iteration k is weighted by k^gamma
+"""
+
+import numpy as np
+import math
+
+class UpdateRule:
+	# Discount exponents alpha/beta (inf for none), averaging exponent gamma, clipping if plus
+	def __init__(self, name = "vanilla", alpha = math.inf, beta = math.inf, gamma = 0.0, plus = False):
+		self.name = name
+		self.alpha = alpha
+		self.beta = beta
+		self.gamma = gamma
+		self.plus = plus
+		self.discounts = alpha != math.inf or beta != math.inf
+		# logs[e][k] = log of the product of m^e/(m^e + 1) over m = 1, ..., k
+		self.logs = {e: np.zeros(1) for e in (alpha, beta) if e != math.inf}
+
+	# Settings that makeRule turns back into this rule
+	def spec(self):
+		return {"name": self.name, "alpha": self.alpha, "beta": self.beta, "gamma": self.gamma}
+
+	# Table of logs[e] covering iterations up to top
+	def table(self, e, top):
+		logs = self.logs[e]
+		# Double the table, always at the same boundaries so that a resumed
+		# run computes bit-for-bit the same values
+		while len(logs) <= top:
+			m = np.arange(len(logs), 2*len(logs), dtype = np.float64)
+			logs = np.concatenate([logs, logs[-1] - np.cumsum(np.log1p(m**-e))])
+		self.logs[e] = logs
+		return logs
+
+	# Product of m^e/(m^e + 1) over m = c + 1, ..., t for an integer c
+	def factor(self, e, c, t):
+		if e == math.inf:
+			return 1.0
+		logs = self.logs[e]
+		if len(logs) <= max(t, c):
+			logs = self.table(e, max(t, c))
+		return math.exp(logs[t] - logs[c])
+
+	# Accumulated regret row discounted from iteration c to t
+	def discount(self, row, c, t):
+		positive = self.factor(self.alpha, c, t)
+		negative = positive if self.beta == self.alpha else self.factor(self.beta, c, t)
+		if positive == negative:
+			return row*positive
+		return np.where(row > 0, row*positive, row*negative)
+
+	# Accumulated regret rows discounted from iterations c (an array) to t
+	def discount_rows(self, rows, c, t):
+		factors = []
+		for e in (self.alpha, self.beta):
+			if e == math.inf:
+				factors.append(1.0)
+			else:
+				logs = self.table(e, max(t, int(c.max(initial = 0))))
+				factors.append(np.exp(logs[t] - logs[c])[:, None])
+		return np.where(rows > 0, rows*factors[0], rows*factors[1])
+
+	# Weight of the current strategy for iterations c + 1, ..., t
+	def weight(self, c, t):
+		if self.gamma == 0:
+			return t - c
+		# Midpoint rule for the sum of k^gamma; exact for gamma = 0 and 1
+		g = self.gamma + 1
+		return ((t + 0.5)**g - (c + 0.5)**g)/g
+
+	# Apply sampled regrets r (a full row) of information set mask at iteration t
+	def update(self, tables, mask, t, r, sigma):
+		c = int(tables.c_I[mask])
+		row = tables.regret[mask]
+		if self.discounts:
+			row = self.discount(row, c, t)
+		row = row + r
+		if self.plus:
+			row = np.maximum(row, 0)
+		tables.regret[mask] = row
+		strategy = self.weight(c, t)*sigma[mask]
+		tables.cumstrat[mask] += strategy
+		tables.cumtotal[mask] += strategy.sum()
+		tables.c_I[mask] = t
+
+	# Apply scatter-added regrets rtilda of the (possibly repeated) infosets at iteration t
+	def update_batch(self, tables, t, infosets, rtilda, sigma, addAt):
+		visited = np.unique(infosets)
+		c = tables.c_I[visited]
+		if self.discounts:
+			tables.regret[visited] = self.discount_rows(tables.regret[visited], c, t)
+		addAt(tables.regret, infosets, rtilda)
+		if self.plus:
+			tables.regret[visited] = np.maximum(tables.regret[visited], 0)
+		strategy = np.reshape(self.weight(c, t), (-1, 1))*sigma[visited]
+		tables.cumstrat[visited] += strategy
+		tables.cumtotal[visited] += strategy.sum(axis = 1)
+		tables.c_I[visited] = t
+		return visited
+
+class VanillaRule(UpdateRule):
+	# The thesis's update, kept as cheap as the original inline code
+	def __init__(self):
+		UpdateRule.__init__(self, "vanilla")
+
+	def update(self, tables, mask, t, r, sigma):
+		tables.regret[mask] += r
+		strategy = (t - tables.c_I[mask])*sigma[mask]
+		tables.cumstrat[mask] += strategy
+		tables.cumtotal[mask] += strategy.sum()
+		tables.c_I[mask] = t
+
+RULES = ["vanilla", "cfr+", "linear", "dcfr"]
+
+"""
+makeRule returns the update rule called name ("vanilla", "cfr+", "linear"
+or "dcfr"); alpha, beta and gamma are only used by "dcfr". An UpdateRule,
+a spec() dict or None (vanilla) are accepted as well.
+"""
+def makeRule(name = "vanilla", alpha = 1.5, beta = 0.0, gamma = 2.0):
+	if isinstance(name, UpdateRule):
+		return name
+	if name is None:
+		name = "vanilla"
+	if isinstance(name, dict):
+		return makeRule(name["name"], name["alpha"], name["beta"], name["gamma"])
+
+	# Corner Case: Unknown rule
+	if name not in RULES:
+		raise ValueError("Unknown update rule: " + str(name))
+	if name == "vanilla":
+		return VanillaRule()
+	if name == "cfr+":
+		return UpdateRule(name, gamma = 1.0, plus = True)
+	if name == "linear":
+		return UpdateRule(name, alpha = 1.0, beta = 1.0, gamma = 1.0)
+	return UpdateRule(name, alpha = alpha, beta = beta, gamma = gamma)
@@ -0,0 +1,111 @@
+"""
+Full-width (vanilla) CFR for Goofspiel over the card-mask abstraction.
+Goofspiel has no chance node (the prize cards are flipped in a fixed
+order), so chance-sampled CFR and vanilla CFR are the same algorithm here.
+Every iteration evaluates the whole tree exactly: the opponent is seen
+through its round marginals P[r, b], so a round's expected payoff h(r, a)
+depends only on the card played, and the counterfactual value of playing a
+at mask m in round r is a dynamic program over remaining-card subsets,
+q(m, a) = h(r, a) + W(m without a), with W(m) = sum_a sigma(m, a) q(m, a).
+All of it is one vectorized pass per round over the flat arrays of the
+GameTree (see BestResponse) compiled once per game size, which gives a
+low-variance reference for MCCFR and AOS.
+
+Both players share the regret and average-strategy tables like the
+sampling engines do. Each iteration adds both players' counterfactual
+regrets under the current profile, averages both strategies weighted by
+their own reach, and regret-matches sigma1 and sigma2 from the shared
+regrets, so after the first iteration the profile is symmetric.
+"""
+
+import numpy as np
+from BestResponse import compileTree
+from Checkpoint import loadCheckpoint, checkpointHook
+from Profiling import combineHooks
+from UpdateRules import makeRule
+from InfoSetTables import InfoSetTables, addAt, regretMatchBatch, exportTables
+
+"""
+ACTUAL GOOFSPIEL SIMULATION W/ FULL-WIDTH CFR
+"""
+def runCFR(player, maxcardvalue, iterations = 1000, checkpoint = None, every = 0, tables = None, profiler = None, onIteration = None, rule = None):
+	N = player
+	maxcard = maxcardvalue
+	# Every information set is updated each iteration, so tables are dense
+	if tables is None:
+		tables = InfoSetTables(maxcard)
+	rule = makeRule(rule)
+	settings = {"algorithm": "cfr", "player": N, "maxcard": maxcard,
+		"iterations": iterations, "every": every, "rule": rule.spec()}
+	hook = combineHooks(checkpointHook(checkpoint, every, tables, settings), onIteration)
+	trainCFR(tables, N, 0, iterations, hook, profiler, rule)
+
+	return exportTables(tables, profiler)
+
+"""
+resumeCFR continues the run saved in checkpoint file path, keeps
+checkpointing to the same file and returns what runCFR returns.
+state is what loadCheckpoint(path) returned, if the caller has already
+loaded it (e.g. to build its hooks on the resumed tables).
+"""
+def resumeCFR(path, profiler = None, onIteration = None, state = None):
+	tables, t, settings, rng, telemetry, baselines, adaptive = state if state is not None else loadCheckpoint(path)
+	hook = combineHooks(checkpointHook(path, settings["every"], tables, settings), onIteration)
+	trainCFR(tables, settings["player"], t, settings["iterations"], hook, profiler, settings["rule"])
+
+	return exportTables(tables, profiler)
+
+"""
+trainCFR runs full-width CFR iterations start, ..., stop - 1 on dense
+tables in place, calling onIteration(t) after every iteration if given
+(stopping early once it returns True) and charging the time of each phase
+to profiler if given. Iteration t is applied as the rule's iteration
+t + 1, so the first one is averaged too.
+"""
+def trainCFR(tables, N, start, stop, onIteration = None, profiler = None, rule = None):
+	# Corner Case: Lazily allocated tables
+	if not isinstance(tables, InfoSetTables):
+		raise ValueError("Full-width CFR needs dense InfoSetTables.")
+	# Corner Case: Only two-player Goofspiel is supported
+	if N != 2:
+		raise ValueError("Full-width CFR needs exactly two players.")
+
+	tree = compileTree(tables.maxcard)
+	masks = tree.masks
+	rule = makeRule(rule)
+	timed = profiler is not None
+
+	# At every iteration
+	for t in range(start, stop):
+		if timed:
+			mark = profiler.start()
+		symmetric = np.array_equal(tables.sigma1, tables.sigma2)
+		reach1 = tree.reach(tables.sigma1)
+		reach2 = reach1 if symmetric else tree.reach(tables.sigma2)
+		P1 = tree.marginals(tables.sigma1, reach1)
+		P2 = P1 if symmetric else tree.marginals(tables.sigma2, reach2)
+		if timed:
+			mark = profiler.lap("reach", mark)
+
+		# Both players' counterfactual regrets under the current profile
+		regret = tree.regrets(tables.sigma1, P2)
+		if symmetric:
+			regret *= 2
+		else:
+			regret += tree.regrets(tables.sigma2, P1)
+		# Both players' strategies weighted by their own reach
+		strategy = reach1[:, None]*tables.sigma1 + reach2[:, None]*tables.sigma2
+		rule.update_batch(tables, t + 1, masks, regret[masks], strategy, addAt)
+		tables.visits[masks] += 1
+		if timed:
+			mark = profiler.lap("regret", mark)
+
+		# Update strategy profile via regret matching
+		tables.sigma1[masks] = regretMatchBatch(tables, masks)
+		tables.sigma2[masks] = tables.sigma1[masks]
+		if timed:
+			profiler.lap("matching", mark)
+
+		# Stop early when the callback asks to (e.g. a ConvergenceScheduler)
+		if onIteration is not None and onIteration(t):
+			break
@@ -0,0 +1,115 @@
+"""
+runCFR runs full-width CFR on Goofspiel as a low-variance reference,
+cleans data, and checks average strategy's performance in Goofspiel.
+"""
+
+import argparse
+from VanillaCFR import runCFR, resumeCFR
+from Checkpoint import loadCheckpoint
+from InfoSetTables import InfoSetTables
+from Results import writeResults, convertToExcel, averageStrategy
+from Policy import exportPolicy
+from Evaluate import evaluateStrategy, exactEvaluate
+from BestResponse import exploitability
+from Profiling import Profiler, Progress, combineHooks
+from Snapshots import StrategySnapshots
+from Scheduler import ConvergenceScheduler, METRICS
+from UpdateRules import RULES, makeRule
+from Sampling import SamplingStream
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--maxcard", type = int, default = 5, help = "number of cards per player")
+parser.add_argument("--iterations", type = int, default = 1000, help = "training iterations")
+parser.add_argument("--rule", choices = RULES, default = "vanilla", help = "regret/average update rule")
+parser.add_argument("--alpha", type = float, default = 1.5, help = "dcfr: positive regret discount exponent")
+parser.add_argument("--beta", type = float, default = 0.0, help = "dcfr: negative regret discount exponent")
+parser.add_argument("--gamma", type = float, default = 2.0, help = "dcfr: average strategy weight exponent")
+parser.add_argument("--seed", type = int, help = "seed of the sampled evaluation games")
+parser.add_argument("--snapshots", type = int, default = 0, help = "iterations between average strategy snapshots (0 disables)")
+parser.add_argument("--target", type = float, help = "stop once the convergence metric is at most this (--iterations becomes a maximum)")
+parser.add_argument("--metric", choices = [metric for metric in METRICS if metric != "variance"], default = "exploitability", help = "convergence metric checked against --target")
+parser.add_argument("--check", type = int, default = 50, help = "iterations between convergence checks")
+parser.add_argument("--patience", type = int, default = 1, help = "successive checks at or below --target before stopping")
+parser.add_argument("--checkpoint", help = "checkpoint file written every --every iterations")
+parser.add_argument("--every", type = int, default = 1000, help = "iterations between checkpoints")
+parser.add_argument("--resume", help = "continue the run saved in this checkpoint file, with its saved settings (the training flags are ignored)")
+parser.add_argument("--progress", type = float, default = 10, help = "seconds between progress reports (0 disables)")
+parser.add_argument("--profile", action = "store_true", help = "time each phase of training and print a report")
+args = parser.parse_args()
+# Corner Case: A resumed run keeps checkpointing to the file it was saved to
+if args.resume is not None and args.checkpoint is not None:
+	parser.error("--resume keeps checkpointing to the resumed file; drop --checkpoint")
+if args.every < 1:
+	parser.error("--every must be positive")
+
+N = 2
+EXCEL = False # also convert results to the old Excel workbook (needs openpyxl)
+state = None
+start = 0
+if args.resume is not None:
+	# Train on the tables saved in the checkpoint
+	state = loadCheckpoint(args.resume)
+	tables, start, settings, rng, telemetry, baselines, adaptive = state
+	# Corner Case: Checkpoint of another algorithm
+	if settings["algorithm"] != "cfr":
+		parser.error(args.resume + " is not a CFR checkpoint")
+	maxcard, iterations = settings["maxcard"], settings["iterations"]
+else:
+	maxcard, iterations = args.maxcard, args.iterations
+	tables = InfoSetTables(maxcard)
+evaluation = SamplingStream(args.seed)
+profiler = Profiler() if args.profile else None
+progress = Progress(iterations, start, interval = args.progress, tables = tables) if args.progress > 0 else None
+snapshots = StrategySnapshots(tables, args.snapshots) if args.snapshots > 0 else None
+scheduler = ConvergenceScheduler(tables, args.metric, args.target, args.check, args.patience) if args.target is not None else None
+hooks = combineHooks(progress, snapshots, scheduler)
+if state is not None:
+	mykey, sigma1, sigma2, regret, cumstrat, visits = resumeCFR(args.resume, profiler, hooks, state)
+else:
+	mykey, sigma1, sigma2, regret, cumstrat, visits = runCFR(N, maxcard, iterations, args.checkpoint, args.every, tables = tables, profiler = profiler, onIteration = hooks, rule = makeRule(args.rule, args.alpha, args.beta, args.gamma))
+
+# Convergence checks and where training stopped
+if scheduler is not None:
+	print(scheduler.format())
+
+# Normalize cumulative strategy profile --> average strategy profile
+avestrat = averageStrategy(tables)
+
+# Exact exploitability of the final and average strategy profiles
+print("Exploitability (sigma1, sigma2): ", exploitability(tables.sigma1, tables.sigma2, maxcard))
+print("Exploitability (average strategy): ", exploitability(avestrat, avestrat, maxcard))
+
+"""
+SIMULATE GAME W/ AVERAGE STRATEGY OBTAINED TO OBSERVE WIN-LOSS-TIE PERCENTAGE
+"""
+totalgames = 1000000
+result = evaluateStrategy(avestrat, maxcard, totalgames, rng = evaluation.rng)
+print("Win %: ", result["win"], "+/-", result["win_ci"])
+print("Loss %: ", result["loss"], "+/-", result["loss_ci"])
+print("Tie %: ", result["tie"], "+/-", result["tie_ci"])
+print("Expected Payoff: ", result["payoff"], "+/-", result["payoff_ci"])
+
+# Exact results against a uniformly random opponent for small games
+if maxcard <= 6:
+	exact = exactEvaluate(avestrat, maxcard)
+	print("Exact Win/Loss/Tie %: ", exact["win"], exact["loss"], exact["tie"])
+	print("Exact Expected Payoff: ", exact["payoff"])
+
+"""
+WRITE RESULTS TO DISK
+"""
+
+if profiler is not None:
+	mark = profiler.start()
+paths = writeResults('CFR_Results', tables)
+exportPolicy('CFR_Policy.pol', avestrat, maxcard)
+if snapshots is not None:
+	snapshots.save('CFR_Snapshots.npz')
+if EXCEL:
+	convertToExcel(paths[0], 'CFR_Results.xlsx')
+
+print("Results Available Now")
+
+if profiler is not None:
+	profiler.lap("export", mark)
+	print(profiler.format(tables))
@@ -3,89 +3,135 @@ runMCCFR runs the entire MCCFR algorithm on Goofspiel, cleans data, and
 checks average strategy's performance in Goofspiel.
 """
 
-from MCCFR import runMCCFR
-import pandas as pd
-from pandas import ExcelWriter
-from pandas import ExcelFile
-from Goofspiel import Goofspiel
-import numpy as np
-import random
+import argparse
+from MCCFR import runMCCFR, resumeMCCFR, SAMPLING
+from Checkpoint import loadCheckpoint
+from Baselines import ValueBaselines
+from InfoSetTables import makeTables
+from Results import writeResults, convertToExcel, averageStrategy
+from Policy import exportPolicy
+from Evaluate import evaluateStrategy, exactEvaluate
+from BestResponse import exploitability
+from Profiling import Profiler, Progress, combineHooks
+from Snapshots import StrategySnapshots
+from Scheduler import ConvergenceScheduler, METRICS
+from UpdateRules import RULES, makeRule
+from Sampling import SamplingStream
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--maxcard", type = int, default = 5, help = "number of cards per player")
+parser.add_argument("--iterations", type = int, default = 100000, help = "training iterations")
+parser.add_argument("--batch", type = int, default = 0, help = "outcome sampling: histories sampled and applied at once per player and iteration (0: one at a time, as in the thesis); external sampling: opponent orders sampled per iteration")
+parser.add_argument("--sampling", choices = SAMPLING, default = "outcome", help = "outcome sampling (the thesis) or external sampling")
+parser.add_argument("--baselines", action = "store_true", help = "outcome sampling: use baseline-corrected (VR-MCCFR) standard outcome-sampling regrets instead of the thesis's, reporting their variance against both on the same samples")
+parser.add_argument("--sparse", action = "store_true", help = "allocate information sets on first visit")
+parser.add_argument("--rule", choices = RULES, default = "vanilla", help = "regret/average update rule")
+parser.add_argument("--alpha", type = float, default = 1.5, help = "dcfr: positive regret discount exponent")
+parser.add_argument("--beta", type = float, default = 0.0, help = "dcfr: negative regret discount exponent")
+parser.add_argument("--gamma", type = float, default = 2.0, help = "dcfr: average strategy weight exponent")
+parser.add_argument("--seed", type = int, help = "seed of every sample drawn (training and evaluation)")
+parser.add_argument("--snapshots", type = int, default = 0, help = "iterations between average strategy snapshots (0 disables)")
+parser.add_argument("--target", type = float, help = "stop once the convergence metric is at most this (--iterations becomes a maximum)")
+parser.add_argument("--metric", choices = [metric for metric in METRICS if metric != "variance"], default = "exploitability", help = "convergence metric checked against --target")
+parser.add_argument("--check", type = int, default = 10000, help = "iterations between convergence checks")
+parser.add_argument("--patience", type = int, default = 1, help = "successive checks at or below --target before stopping")
+parser.add_argument("--checkpoint", help = "checkpoint file written every --every iterations")
+parser.add_argument("--every", type = int, default = 1000, help = "iterations between checkpoints")
+parser.add_argument("--resume", help = "continue the run saved in this checkpoint file, with its saved settings (the training flags are ignored)")
+parser.add_argument("--progress", type = float, default = 10, help = "seconds between progress reports (0 disables)")
+parser.add_argument("--profile", action = "store_true", help = "time each phase of training and print a report")
+args = parser.parse_args()
+# Corner Case: Invalid Input
+if args.batch < 0:
+	parser.error("--batch must be non-negative")
+# Corner Case: A resumed run keeps checkpointing to the file it was saved to
+if args.resume is not None and args.checkpoint is not None:
+	parser.error("--resume keeps checkpointing to the resumed file; drop --checkpoint")
+if args.every < 1:
+	parser.error("--every must be positive")
+# Corner Case: External sampling updates every information set, so it needs dense tables
+if args.sampling == "external" and args.sparse:
+	parser.error("--sampling external needs dense tables (drop --sparse)")
+# Corner Case: Baselines only correct outcome-sampled regrets
+if args.sampling == "external" and args.baselines:
+	parser.error("--baselines needs --sampling outcome")
 
 N = 2
-maxcard = 5
-mykey, sigma1, sigma2, regret, cumstrat, visits = runMCCFR(N, maxcard)
+EXCEL = False # also convert results to the old Excel workbook (needs openpyxl)
+state = None
+start = 0
+if args.resume is not None:
+	# Train on the tables, stream and baselines saved in the checkpoint
+	state = loadCheckpoint(args.resume)
+	tables, start, settings, rng, telemetry, baselines, adaptive = state
+	# Corner Case: Checkpoint of another algorithm
+	if settings["algorithm"] != "mccfr":
+		parser.error(args.resume + " is not a MCCFR checkpoint")
+	maxcard, iterations = settings["maxcard"], settings["iterations"]
+else:
+	maxcard, iterations = args.maxcard, args.iterations
+	tables = makeTables(maxcard, args.sparse)
+	baselines = ValueBaselines(maxcard) if args.baselines else None
+stream = SamplingStream(args.seed)
+training, evaluation = stream.spawn(2)
+profiler = Profiler() if args.profile else None
+progress = Progress(iterations, start, interval = args.progress, tables = tables) if args.progress > 0 else None
+snapshots = StrategySnapshots(tables, args.snapshots) if args.snapshots > 0 else None
+scheduler = ConvergenceScheduler(tables, args.metric, args.target, args.check, args.patience) if args.target is not None else None
+hooks = combineHooks(progress, snapshots, scheduler)
+if state is not None:
+	mykey, sigma1, sigma2, regret, cumstrat, visits = resumeMCCFR(args.resume, profiler, hooks, state)
+else:
+	mykey, sigma1, sigma2, regret, cumstrat, visits = runMCCFR(N, maxcard, iterations, args.batch, checkpoint = args.checkpoint, every = args.every, tables = tables, profiler = profiler, onIteration = hooks, rng = training, rule = makeRule(args.rule, args.alpha, args.beta, args.gamma), sampling = args.sampling, baselines = baselines)
+if hasattr(tables, "dense"):
+	tables = tables.dense()
+
+# Variance of the sampled regrets under the default (thesis), plain and baseline-corrected estimators
+if baselines is not None:
+	print(baselines.format())
+
+# Convergence checks and where training stopped
+if scheduler is not None:
+	print(scheduler.format())
 
 # Normalize cumulative strategy profile --> average strategy profile
-avestrat = {}
-# For each information set
-for hashval in cumstrat:
-	avestrat[hashval] = {}
-	if sum(cumstrat[hashval].values()) == 0:
-		# For each action
-		for action in cumstrat[hashval]:
-			avestrat[hashval][action] = 1/len(cumstrat[hashval])
-	else:
-		# For each action
-		for action in cumstrat[hashval]:
-			avestrat[hashval][action] = float(cumstrat[hashval][action])/sum(cumstrat[hashval].values())
+avestrat = averageStrategy(tables)
+
+# Exact exploitability of the final and average strategy profiles
+print("Exploitability (sigma1, sigma2): ", exploitability(tables.sigma1, tables.sigma2, maxcard))
+print("Exploitability (average strategy): ", exploitability(avestrat, avestrat, maxcard))
 
 """
 SIMULATE GAME W/ AVERAGE STRATEGY OBTAINED TO OBSERVE WIN-LOSS-TIE PERCENTAGE
 """
-totalgames = 10000
-count = [0]*3 # number of wins for player
-for itr in range(totalgames):
-	actions = list(range(1, maxcard + 1))
-	strategy = []
-	# Select actions based on avestrat
-	for i in range(maxcard):
-		hashval = hash(tuple(actions))
-		# Pull out option given distribution(information set)
-		options = list(avestrat[hashval].keys())
-		distribution = list(avestrat[hashval].values())
-		choice = np.random.choice(options, size = 1, p = distribution)
-		strategy += [choice]
-		actions.remove(choice)
-	
-	opponent = list(range(1, maxcard + 1))
-	random.shuffle(opponent)
-	# Simulate Results Given Choices of Actions
-	Goof = Goofspiel(maxcard, strategy, opponent)
-	r = Goof.play_round()
-
-	if r[0] > r[1]: # win
-		count[0] += 1
-	elif r[0] < r[1]: # loss
-		count[1] += 1
-	else: # tie
-		count[2] += 1
+totalgames = 1000000
+result = evaluateStrategy(avestrat, maxcard, totalgames, rng = evaluation.rng)
+print("Win %: ", result["win"], "+/-", result["win_ci"])
+print("Loss %: ", result["loss"], "+/-", result["loss_ci"])
+print("Tie %: ", result["tie"], "+/-", result["tie_ci"])
+print("Expected Payoff: ", result["payoff"], "+/-", result["payoff_ci"])
 
-print("Win %: ", count[0]/totalgames)
-print("Loss %: ", count[1]/totalgames)
-print("Tie %: ", count[2]/totalgames)
+# Exact results against a uniformly random opponent for small games
+if maxcard <= 6:
+	exact = exactEvaluate(avestrat, maxcard)
+	print("Exact Win/Loss/Tie %: ", exact["win"], exact["loss"], exact["tie"])
+	print("Exact Expected Payoff: ", exact["payoff"])
 
 """
-WRITE RESULTS TO EXCEL FILE
+WRITE RESULTS TO DISK
 """
 
-results_key = pd.DataFrame([mykey])
-results_strategy1 = pd.DataFrame(sigma1)
-results_strategy2 = pd.DataFrame(sigma2)
-results_regret = pd.DataFrame(regret)
-results_cum = pd.DataFrame(cumstrat)
-results_ave = pd.DataFrame(avestrat)
-results_visits = pd.DataFrame([visits])
+if profiler is not None:
+	mark = profiler.start()
+paths = writeResults('MCCFR_Results', tables)
+exportPolicy('MCCFR_Policy.pol', avestrat, maxcard)
+if snapshots is not None:
+	snapshots.save('MCCFR_Snapshots.npz')
+if EXCEL:
+	convertToExcel(paths[0], 'MCCFR_Results.xlsx')
 
-
-
-file = ExcelWriter('MCCFR_Results.xlsx')
-results_key.to_excel(file, 'Key Book', index = False)
-results_strategy1.to_excel(file, 'Player 1 Strategies', index = False)
-results_strategy2.to_excel(file, 'Player 2 Strategies', index = False)
-results_regret.to_excel(file, 'Overall Regrets', index = False)
-results_cum.to_excel(file, 'Cumulative Strategy', index = False)
-results_ave.to_excel(file, 'Average Strategy', index = False)
-results_visits.to_excel(file, 'Visits', index = False)
-
-file.save()
 print("Results Available Now")
+
+if profiler is not None:
+	profiler.lap("export", mark)
+	print(profiler.format(tables))